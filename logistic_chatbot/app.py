@@ -1,23 +1,37 @@
 import streamlit as st
 import pandas as pd
 import os
+import json
+import math
 import uuid
 from datetime import datetime
 from utils import (
-    ask_gpt,
-    ask_gpt_with_data,
-    save_chat_history,
-    clear_chat_history,
-    validate_dataframe,
-    get_chat_history,
-    save_conversation_metadata,
-    get_conversation_metadata
+    ask_gpt_stream,
+    ask_gpt_with_data_stream,
+    ask_gpt_with_query_stream,
+    append_chat_messages,
+    clear_conversation_history,
+    get_conversation_store,
+    load_chat_history,
+    save_conversation,
+    list_conversations,
+    count_conversations,
+    search_conversations
 )
+from ingest import FrameHandle, default_sheet, list_sheets, load_large_csv, load_uploaded_file
+from precompute import get_precompute, start_precompute
+from deep_analysis import ask_gpt_deep_stream
+from scheduler import get_scheduler
+import tracing
 
 # ---- Constants ----
 MAX_FILE_SIZE_MB = 10
+LARGE_FILE_MAX_MB = 1024  # CSVs above MAX_FILE_SIZE_MB are streamed, never loaded whole
 ALLOWED_FILE_TYPES = ["xlsx", "xls", "csv"]
 MAX_DISPLAY_ROWS = 100
+HISTORY_PAGE_SIZE = 20  # Messages shown at first and added per "Show earlier messages"
+CONVERSATION_PAGE_SIZE = 20
+SHOW_ADMIN_PANEL = os.getenv("ADMIN_PANEL", "0") == "1"  # Per-stage latency table in the sidebar
 
 # ---- Setup page ----
 st.set_page_config(
@@ -30,18 +44,128 @@ st.set_page_config(
 )
 st.title("📊 Logistics Data Analyst")
 
+# ---- Conversation Store ----
+@st.cache_resource
+def init_conversation_store():
+    """Open the store once per process and import legacy JSON histories"""
+    store = get_conversation_store()
+    store.migrate_json_files()
+    return store
+
+init_conversation_store()
+
+@st.cache_resource
+def init_metrics_endpoint():
+    """Expose /metrics once per process when TRACE_METRICS_PORT is set"""
+    return tracing.start_metrics_server()
+
+init_metrics_endpoint()
+
 # ---- Initialize Session State ----
 def initialize_session():
     if "current_conversation" not in st.session_state:
         st.session_state.current_conversation = str(uuid.uuid4())
     if "messages" not in st.session_state:
-        st.session_state.messages = get_chat_history(st.session_state.current_conversation + ".json")
-    if "uploaded_df" not in st.session_state:
-        st.session_state.uploaded_df = None
+        set_messages(load_chat_history(st.session_state.current_conversation, limit=HISTORY_PAGE_SIZE))
+    if "data_handle" not in st.session_state:
+        st.session_state.data_handle = None
     if "file_name" not in st.session_state:
         st.session_state.file_name = None
-    if "conversations" not in st.session_state:
-        st.session_state.conversations = get_conversation_metadata()
+    if "file_id" not in st.session_state:
+        st.session_state.file_id = None
+    if "sheet_name" not in st.session_state:
+        st.session_state.sheet_name = None
+    if "sheet_list" not in st.session_state:
+        st.session_state.sheet_list = (None, [])
+    if "file_digest" not in st.session_state:
+        st.session_state.file_digest = None
+    if "data_summary" not in st.session_state:
+        st.session_state.data_summary = None
+    if "data_shape" not in st.session_state:
+        st.session_state.data_shape = None
+
+def set_messages(messages):
+    """Replace the displayed conversation, showing its last page"""
+    st.session_state.messages = messages
+    st.session_state.history_visible = HISTORY_PAGE_SIZE
+    # A full page suggests the store holds older messages
+    st.session_state.history_has_more = len(messages) >= HISTORY_PAGE_SIZE
+    st.session_state.rendered_messages = {}
+
+def show_earlier_messages():
+    """Reveal the next page: loaded but hidden messages first, then older ones from the store"""
+    messages = st.session_state.messages
+    if len(messages) <= st.session_state.history_visible and st.session_state.history_has_more:
+        oldest_id = next((m["_id"] for m in messages if "_id" in m), None)
+        page = load_chat_history(st.session_state.current_conversation, limit=HISTORY_PAGE_SIZE,
+                                 before_id=oldest_id) if oldest_id is not None else []
+        st.session_state.history_has_more = len(page) == HISTORY_PAGE_SIZE
+        messages[:0] = page  # In place, so rendered_messages keys stay valid
+    st.session_state.history_visible += HISTORY_PAGE_SIZE
+
+def rendered_insights(message):
+    """(caption, JSON) of a message's data insights, formatted once per session"""
+    cache = st.session_state.rendered_messages
+    key = id(message)  # Message dicts live as long as the session's message list
+    if key not in cache:
+        insights = message["data_insights"]
+        shape = insights.get("shape")
+        caption = " · ".join(filter(None, [
+            f"📁 {insights['file']}" if insights.get("file") else None,
+            f"{shape[0]} rows × {shape[1]} columns" if shape else None,
+            "🧮 computed query" if "query" in insights else None,
+            "🔬 deep analysis" if "deep_analysis" in insights else None,
+        ]))
+        cache[key] = (caption, json.dumps(insights, ensure_ascii=False, indent=2, default=str))
+    return cache[key]
+
+def reset_uploaded_data():
+    st.session_state.data_handle = None
+    st.session_state.file_name = None
+    st.session_state.file_id = None
+    st.session_state.sheet_name = None
+    st.session_state.sheet_list = (None, [])
+    st.session_state.file_digest = None
+    st.session_state.data_summary = None
+    st.session_state.data_shape = None
+
+def uploaded_sheets(uploaded_file):
+    """Worksheets of an uploaded workbook, listed once per upload ([] for CSV)"""
+    file_id, sheets = st.session_state.sheet_list
+    if file_id != uploaded_file.file_id:
+        sheets = list_sheets(uploaded_file.name, uploaded_file.getvalue())
+        st.session_state.sheet_list = (uploaded_file.file_id, sheets)
+    return sheets
+
+def sheet_label(sheet):
+    """Sheet name with the size read from the workbook's metadata"""
+    size = f"{len(sheet['columns'])} columns" if sheet["rows"] is None \
+        else f"{sheet['rows']} rows × {len(sheet['columns'])} columns"
+    return f"{sheet['name']} ({size})"
+
+def get_uploaded_df():
+    """Dataset of this session; reloaded from the on-disk spill if it was evicted while idle"""
+    handle = st.session_state.data_handle
+    return handle.get() if handle is not None else None
+
+def get_data_job():
+    """Background analysis of the uploaded data (restarted if it was dropped); None in large-file mode"""
+    if st.session_state.data_handle is None or st.session_state.data_summary is not None:
+        return None
+    job = get_precompute(st.session_state.file_digest)
+    if job is None:
+        job = start_precompute(st.session_state.file_digest, get_uploaded_df())
+    return job
+
+def show_pending(job, task, message):
+    """Caption for a background result that is not available yet"""
+    error = job.error(task)
+    st.caption(message if error is None else f"⚠️ Could not compute this: {str(error)}")
+
+def open_conversation(conversation_id):
+    st.session_state.current_conversation = conversation_id
+    set_messages(load_chat_history(conversation_id, limit=HISTORY_PAGE_SIZE))
+    st.rerun()
 
 initialize_session()
 
@@ -54,39 +178,78 @@ with st.sidebar:
     uploaded_file = st.file_uploader(
         "Upload your logistics data file",
         type=ALLOWED_FILE_TYPES,
-        help=f"Supports Excel and CSV files up to {MAX_FILE_SIZE_MB}MB"
+        help=f"Supports Excel and CSV files up to {MAX_FILE_SIZE_MB}MB, "
+             f"and CSV up to {LARGE_FILE_MAX_MB}MB in large-file mode"
     )
    
     if uploaded_file:
         try:
             file_size = uploaded_file.size / (1024 * 1024)
-            if file_size > MAX_FILE_SIZE_MB:
-                st.error(f"File too large. Max size: {MAX_FILE_SIZE_MB}MB")
+            is_csv = uploaded_file.name.lower().endswith('.csv')
+            large_file = file_size > MAX_FILE_SIZE_MB
+            if large_file and not is_csv:
+                st.error(f"File too large. Max size for Excel: {MAX_FILE_SIZE_MB}MB")
+            elif file_size > LARGE_FILE_MAX_MB:
+                st.error(f"File too large. Max size: {LARGE_FILE_MAX_MB}MB")
             else:
-                with st.spinner("Analyzing data..."):
-                    if uploaded_file.name.endswith('.csv'):
-                        df = pd.read_csv(uploaded_file)
+                # Workbooks: only sheet names and header rows are read until a sheet is chosen
+                sheet = None
+                sheets = [] if is_csv else uploaded_sheets(uploaded_file)
+                if len(sheets) > 1:
+                    labels = {s["name"]: sheet_label(s) for s in sheets}
+                    names = list(labels)
+                    sheet = st.selectbox("Sheet", names, index=names.index(default_sheet(sheets)),
+                                         format_func=labels.get, key="sheet_select")
+                elif sheets:
+                    sheet = default_sheet(sheets)
+                # Reruns with the same upload skip hashing and parsing entirely
+                if st.session_state.file_id != uploaded_file.file_id or st.session_state.data_handle is None \
+                        or st.session_state.sheet_name != sheet:
+                    if large_file:
+                        with st.spinner("Streaming large file..."):
+                            profile, digest = load_large_csv(uploaded_file)
+                            df = profile.sample
+                            st.session_state.data_summary = profile.summary_markdown()
+                            st.session_state.data_shape = (profile.rows, len(profile.columns))
                     else:
-                        df = pd.read_excel(uploaded_file)
-                   
-                    validate_dataframe(df)
-                    st.session_state.uploaded_df = df
-                    st.session_state.file_name = uploaded_file.name
-                    st.success(f"✅ {uploaded_file.name} loaded successfully!")
-                   
-                    with st.expander("🔍 Data Preview"):
-                        st.dataframe(df.head(min(len(df), MAX_DISPLAY_ROWS)))
-                        st.caption(f"Shape: {df.shape[0]} rows, {df.shape[1]} columns")
+                        with st.spinner("Loading data..."):
+                            df, digest = load_uploaded_file(uploaded_file.name, uploaded_file.getvalue(),
+                                                            sheet=sheet)
+                            st.session_state.data_summary = None
+                            st.session_state.data_shape = df.shape
+                            # Summary, statistics, KPIs and the row index are built while the user types
+                            start_precompute(digest, df)
+                    # Large-file samples are small and have no spill, so the session keeps them
+                    st.session_state.data_handle = FrameHandle(digest, df, pin=large_file)
+                    st.session_state.file_name = uploaded_file.name if len(sheets) <= 1 \
+                        else f"{uploaded_file.name} — {sheet}"
+                    st.session_state.file_id = uploaded_file.file_id
+                    st.session_state.sheet_name = sheet
+                    st.session_state.file_digest = digest
+                rows, cols = st.session_state.data_shape
+                st.success(f"✅ {st.session_state.file_name} loaded successfully!")
+                job = get_data_job()
+                if job is not None and not job.done:
+                    finished, total = job.progress()
+                    st.progress(finished / total, text=f"{job.current_label()}... ({finished}/{total})")
+               
+                with st.expander("🔍 Data Preview"):
+                    preview = job.get("preview") if job is not None else None
+                    if preview is None:
+                        preview = get_uploaded_df().head(MAX_DISPLAY_ROWS)
+                    st.dataframe(preview)
+                    st.caption(f"Shape: {rows} rows, {cols} columns")
+                    if st.session_state.data_summary is not None:
+                        st.caption(f"Large-file mode: chat uses full-file statistics and a {len(preview)}-row sample")
        
         except Exception as e:
             st.error(f"❌ Error loading file: {str(e)}")
-            st.session_state.uploaded_df = None
+            reset_uploaded_data()
 
     # Delete uploaded data button
-    if st.session_state.uploaded_df is not None:
+    if st.session_state.data_handle is not None:
         if st.button("🗑️ Delete Uploaded Data", use_container_width=True, key="delete_data"):
-            st.session_state.uploaded_df = None
-            st.session_state.file_name = None
+            reset_uploaded_data()
             st.rerun()
 
     # Analysis Controls
@@ -96,58 +259,122 @@ with st.sidebar:
         ["Quick Overview", "Detailed Analysis", "Deep Examination"],
         help="Choose how thoroughly to analyze the data"
     )
+    use_cached_answers = st.checkbox(
+        "Reuse cached answers",
+        value=True,
+        help="Answer repeated questions about the same data from the response cache"
+    )
+    compute_exact = st.checkbox(
+        "Compute exact figures",
+        value=True,
+        help="Run filters and aggregations locally on the full data and ground the answer in the result"
+    )
    
     # Chat Management
     st.subheader("💬 Conversation History")
     
-    # Conversation list
-    conversations = st.session_state.conversations
-    if conversations:
-        selected_conv = st.selectbox(
+    # Full-text search across every saved message
+    search_query = st.text_input("🔎 Search chats", key="conv_search")
+    if search_query:
+        try:
+            hits = search_conversations(search_query, limit=CONVERSATION_PAGE_SIZE)
+        except Exception as e:
+            st.error(f"❌ {str(e)}")
+            hits = []
+        if not hits:
+            st.caption("No matching messages")
+        for hit in hits:
+            st.caption(hit["snippet"])
+            if st.button(f"Open: {hit['title'] or hit['conversation_id']}", key=f"hit_{hit['message_id']}",
+                         use_container_width=True):
+                open_conversation(hit["conversation_id"])
+    
+    # Conversation list, one indexed page at a time
+    try:
+        total_conversations = count_conversations()
+    except Exception as e:
+        st.error(f"❌ {str(e)}")
+        total_conversations = 0
+    if total_conversations:
+        page_count = math.ceil(total_conversations / CONVERSATION_PAGE_SIZE)
+        page = 1
+        if page_count > 1:
+            page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="conv_page")
+        try:
+            page_conversations = list_conversations(
+                limit=CONVERSATION_PAGE_SIZE,
+                offset=(page - 1) * CONVERSATION_PAGE_SIZE
+            )
+        except Exception as e:
+            st.error(f"❌ {str(e)}")
+            page_conversations = []
+        titles = {conv["id"]: conv["title"] for conv in page_conversations}
+        # Options are ids, so chats with identical titles stay distinguishable
+        selected_conv_id = st.selectbox(
             "Saved Conversations",
-            options=[conv["title"] for conv in conversations],
-            format_func=lambda x: x[:50] + "..." if len(x) > 50 else x,
+            options=list(titles),
+            format_func=lambda x: titles[x][:50] + "..." if len(titles[x]) > 50 else titles[x],
             key="conv_select"
         )
         
-        if st.button("🔍 Load Conversation", use_container_width=True):
-            selected_conv_data = next(conv for conv in conversations if conv["title"] == selected_conv)
-            st.session_state.current_conversation = selected_conv_data["id"]
-            st.session_state.messages = get_chat_history(selected_conv_data["id"] + ".json")
-            st.rerun()
+        if st.button("🔍 Load Conversation", use_container_width=True) and selected_conv_id:
+            open_conversation(selected_conv_id)
     
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🧹 Clear Current Chat", use_container_width=True):
-            st.session_state.messages = []
-            save_chat_history([], st.session_state.current_conversation + ".json")
+            set_messages([])
+            clear_conversation_history(st.session_state.current_conversation)
             st.rerun()
     with col2:
         if st.button("🆕 New Conversation", use_container_width=True):
             new_conv_id = str(uuid.uuid4())
             new_conv_title = f"Chat {datetime.now().strftime('%Y-%m-%d %H:%M')}"
             
-            st.session_state.conversations.append({
+            save_conversation({
                 "id": new_conv_id,
                 "title": new_conv_title,
                 "created_at": datetime.now().isoformat()
             })
-            save_conversation_metadata(st.session_state.conversations)
             
             st.session_state.current_conversation = new_conv_id
-            st.session_state.messages = []
-            st.session_state.uploaded_df = None
-            st.session_state.file_name = None
+            set_messages([])
+            reset_uploaded_data()
             st.rerun()
 
+    # Admin Panel
+    if SHOW_ADMIN_PANEL:
+        with st.expander("⏱️ Stage Latency"):
+            stats = tracing.stage_stats()
+            if stats:
+                st.dataframe(pd.DataFrame(stats).set_index("stage")[["count", "errors", "p50_s", "p95_s"]])
+                llm = next((row for row in stats if row["stage"] == "llm"), None)
+                if llm is not None and "ttft_s_p50" in llm:
+                    st.caption(f"LLM time to first token: p50 {llm['ttft_s_p50']:.2f}s, p95 {llm['ttft_s_p95']:.2f}s")
+                if llm is not None and "queue_wait_s_p95" in llm:
+                    st.caption(f"LLM queue wait p95: {llm['queue_wait_s_p95']:.3f}s")
+            else:
+                st.caption("No requests traced yet")
+            scheduler = get_scheduler().stats()
+            st.caption(f"Scheduler: {scheduler['queued']} queued, {scheduler['in_flight']} in flight "
+                       f"(limit {scheduler['concurrency']}), {scheduler['rate_limited']} rate-limited")
+
 # ---- Display Chat History ----
-for message in st.session_state.messages:
+# Only the last history_visible messages are rendered, so reruns stay cheap in long chats
+if len(st.session_state.messages) > st.session_state.history_visible or st.session_state.history_has_more:
+    st.button("⬆️ Show earlier messages", on_click=show_earlier_messages, use_container_width=True)
+for index in range(max(0, len(st.session_state.messages) - st.session_state.history_visible),
+                   len(st.session_state.messages)):
+    message = st.session_state.messages[index]
     avatar = "🛒" if message["role"] == "user" else "📊"
     with st.chat_message(message["role"], avatar=avatar):
         st.markdown(message["content"])
         if "data_insights" in message:
-            with st.expander("View Data Insights"):
-                st.write(message["data_insights"])
+            caption, insights_json = rendered_insights(message)
+            # Insights are sent to the browser only while toggled open
+            if st.toggle(f"View Data Insights{' — ' + caption if caption else ''}",
+                         key=f"insights_{message.get('_id', id(message))}"):
+                st.code(insights_json, language="json")
 
 # ---- Chat Input ----
 if prompt := st.chat_input("Ask about the logistics data..."):
@@ -157,61 +384,151 @@ if prompt := st.chat_input("Ask about the logistics data..."):
    
     # Generate and display assistant response
     with st.chat_message("assistant", avatar="📊"):
-        with st.spinner("🔍 Analyzing data..."):
-            try:
-                if st.session_state.uploaded_df is not None:
-                    response = ask_gpt_with_data(
+        try:
+            with tracing.span("chat.turn", with_data=st.session_state.data_handle is not None):
+                df = get_uploaded_df()
+                job = get_data_job()
+                if job is not None and not job.wait(timeout=0):
+                    # Wait for the background analysis rather than repeating it inline
+                    with st.spinner("⏳ Finishing data analysis..."):
+                        job.wait()
+                query_info = None
+                deep_info = None
+                data_system_content = f"""
+                            You are a Logistics Data Analyst. Provide {analysis_depth} of this data.
+                            Include specific numbers and actionable insights when possible.
+                            """
+                # Earlier turns let follow-ups refer back; the builder trims them to the context window
+                context = {"history": st.session_state.messages,
+                           "conversation_id": st.session_state.current_conversation}
+                full_data = st.session_state.data_handle is not None and st.session_state.data_summary is None
+                if full_data and analysis_depth == "Deep Examination":
+                    # Slices are analyzed concurrently and merged by one final streamed call
+                    progress = st.progress(0.0, text="🔬 Splitting data...")
+                    stream, deep_info = ask_gpt_deep_stream(
                         prompt=prompt,
-                        df=st.session_state.uploaded_df,
-                        system_content=f"""
-                        You are a Logistics Data Analyst. Provide {analysis_depth} of this data.
-                        Include specific numbers and actionable insights when possible.
-                        """
+                        df=df,
+                        system_content=data_system_content,
+                        use_cache=use_cached_answers,
+                        **context,
+                        on_progress=lambda done, total, label: progress.progress(
+                            done / total, text=f"🔬 Analyzed {label} ({done}/{total})")
                     )
+                    progress.empty()
+                # Large-file mode only holds a sample in memory, so exact queries are not possible
+                elif full_data and compute_exact:
+                    with st.spinner("🧮 Computing figures..."):
+                        stream, query_info = ask_gpt_with_query_stream(
+                            prompt=prompt,
+                            df=df,
+                            system_content=data_system_content,
+                            use_cache=use_cached_answers,
+                            **context
+                        )
+                    if query_info is not None:
+                        with st.expander("🧮 Computed Result"):
+                            st.dataframe(query_info["result"])
+                elif st.session_state.data_handle is not None:
+                    with st.spinner("🔍 Analyzing data..."):
+                        stream = ask_gpt_with_data_stream(
+                            prompt=prompt,
+                            df=df,
+                            system_content=data_system_content,
+                            data_context=st.session_state.data_summary,
+                            use_cache=use_cached_answers,
+                            **context
+                        )
                 else:
-                    response = ask_gpt(
+                    stream = ask_gpt_stream(
                         prompt=prompt,
-                        system_content="You are a Logistics Expert. Provide helpful information."
+                        system_content="You are a Logistics Expert. Provide helpful information.",
+                        use_cache=use_cached_answers,
+                        **context
                     )
-               
-                st.markdown(response)
-               
+           
+                # Render chunks as they arrive; returns the full text once done
+                response = st.write_stream(stream)
+           
                 message = {
                     "role": "assistant",
                     "content": response,
                     "timestamp": datetime.now().isoformat()
                 }
-               
-                if st.session_state.uploaded_df is not None:
+           
+                if st.session_state.data_handle is not None:
                     message["data_insights"] = {
                         "file": st.session_state.file_name,
-                        "shape": st.session_state.uploaded_df.shape
+                        "shape": st.session_state.data_shape
                     }
-               
-                st.session_state.messages.append({"role": "user", "content": prompt})
+                    if query_info is not None:
+                        message["data_insights"]["query"] = query_info["query"]
+                        message["data_insights"]["result"] = json.loads(query_info["result"].to_json(orient="records", date_format="iso"))
+                    if deep_info is not None:
+                        message["data_insights"]["deep_analysis"] = deep_info
+           
+                user_message = {"role": "user", "content": prompt}
+                st.session_state.messages.append(user_message)
                 st.session_state.messages.append(message)
-                save_chat_history(st.session_state.messages, st.session_state.current_conversation + ".json")
-               
+                # Only the two new messages are written; earlier turns stay untouched
+                append_chat_messages(st.session_state.current_conversation, [user_message, message])
+           
                 # Update conversation title if it's the first message
                 if len(st.session_state.messages) == 2:
                     new_title = prompt[:50] + "..." if len(prompt) > 50 else prompt
-                    for conv in st.session_state.conversations:
-                        if conv["id"] == st.session_state.current_conversation:
-                            conv["title"] = new_title
-                    save_conversation_metadata(st.session_state.conversations)
-               
-            except Exception as e:
-                st.error(f"⚠️ Analysis failed: {str(e)}")
+                    save_conversation({
+                        "id": st.session_state.current_conversation,
+                        "title": new_title,
+                        "created_at": datetime.now().isoformat()
+                    })
+           
+        except Exception as e:
+            st.error(f"⚠️ Analysis failed: {str(e)}")
 
 # ---- Data Summary Section ----
-if st.session_state.uploaded_df is not None:
+if st.session_state.data_handle is not None:
+    # Results come from the background job, so reruns neither recompute them nor reload the frame
+    job = get_data_job()
     with st.expander("📈 Data Summary", expanded=False):
-        tab1, tab2 = st.tabs(["Statistics", "Sample Data"])
+        tab1, tab2, tab3 = st.tabs(["Statistics", "Sample Data", "KPIs"])
        
         with tab1:
             st.subheader("Statistical Summary")
-            st.write(st.session_state.uploaded_df.describe())
+            if st.session_state.data_summary is not None:
+                st.markdown(st.session_state.data_summary)
+            elif job.ready("describe"):
+                st.write(job.get("describe"))
+            else:
+                show_pending(job, "describe", "Statistics are still being computed...")
        
         with tab2:
             st.subheader("Data Sample")
-            st.dataframe(st.session_state.uploaded_df.sample(min(10, len(st.session_state.uploaded_df))))
\ No newline at end of file
+            if job is None:
+                sample_df = get_uploaded_df()
+                st.dataframe(sample_df.sample(min(10, len(sample_df))))
+            elif job.ready("sample"):
+                st.dataframe(job.get("sample"))
+            else:
+                show_pending(job, "sample", "Sample is still being drawn...")
+       
+        with tab3:
+            st.subheader("Logistics KPIs")
+            if st.session_state.data_summary is not None:
+                st.caption("KPIs are not available in large-file mode")
+            elif not job.ready("kpi"):
+                show_pending(job, "kpi", "KPIs are still being aggregated...")
+            else:
+                cube = job.get("kpi")
+                if cube.is_empty:
+                    st.caption("No date, dimension or measure columns were recognised")
+                else:
+                    monthly = cube.table("monthly")
+                    if monthly is not None:
+                        st.markdown("**Monthly totals**")
+                        st.line_chart(monthly)
+                    for role, col in cube.roles["dimensions"].items():
+                        by_dim = cube.table(f"by_{role}")
+                        st.markdown(f"**By {col}**")
+                        st.bar_chart(by_dim[by_dim.columns[0]].head(20))
+                    totals = cube.table("totals")
+                    if totals is not None:
+                        st.dataframe(totals)
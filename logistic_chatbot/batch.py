@@ -0,0 +1,264 @@
+"""
+Headless batch analysis of a directory of logistics exports
+
+    python batch.py exports/ -q "Which carrier has the most delays?" --questions questions.txt --out reports/
+
+Files are parsed and summarized in a process pool; LLM questions run on a
+thread pool no wider than --llm-concurrency. Every finished file and answer
+is appended to results.jsonl right away, so an interrupted run picks up
+where it stopped when started again with the same --out directory.
+"""
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SUPPORTED_EXTENSIONS = (".csv", ".xlsx", ".xls")
+RESULTS_FILE = "results.jsonl"
+REPORT_FILE = "report.md"
+
+
+def find_files(directory: str) -> List[str]:
+    """Supported data files directly inside directory, sorted by name"""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(SUPPORTED_EXTENSIONS) and not name.startswith("~$")
+    )
+
+
+def read_questions(path: Optional[str], inline: List[str]) -> List[str]:
+    """Questions from a file (one per line, # starts a comment) followed by -q ones"""
+    questions = []
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            questions += [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    questions += [q.strip() for q in inline if q.strip()]
+    return list(dict.fromkeys(questions))  # Drop duplicates, keep order
+
+
+def file_digest(path: str) -> str:
+    from ingest import hash_bytes
+    with open(path, "rb") as f:
+        return hash_bytes(f.read())
+
+
+def load_file(path: str) -> Tuple["pd.DataFrame", str, Optional[str]]:
+    """
+    Parse a file, choosing a workbook's sheet the way the app does
+    Returns:
+        tuple: (dataframe, digest of the file bytes, sheet name or None for CSV)
+    """
+    from ingest import default_sheet, hash_bytes, list_sheets, load_uploaded_file
+
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    # The file digest (not the sheet's) keys resumption, matching file_digest
+    digest = hash_bytes(data)
+    sheet = default_sheet(list_sheets(name, data, digest))
+    df, _ = load_uploaded_file(name, data, digest, sheet=sheet)
+    return df, digest, sheet
+
+
+def analyze_file(path: str) -> Dict:
+    """
+    Parse, analyze and summarize one file (runs in a worker process)
+    Returns:
+        dict: "file" record for results.jsonl; errors are reported, not raised
+    """
+    from excel_analyzer import analyze_order_file
+    from utils import summarize_data
+
+    record = {"type": "file", "file": os.path.basename(path), "path": path,
+              "finished_at": None, "error": None}
+    try:
+        df, digest, sheet = load_file(path)
+        record.update(
+            digest=digest,
+            sheet=sheet,
+            rows=len(df),
+            columns=len(df.columns),
+            analysis=analyze_order_file(path, sheet),  # Reuses the frame parsed above
+            summary=summarize_data(df),
+        )
+    except Exception as e:
+        record["error"] = str(e)
+    record["finished_at"] = datetime.now().isoformat()
+    return record
+
+
+def answer_question(path: str, question: str, exact: bool) -> Dict:
+    """Answer one question about one file (runs on the LLM thread pool)"""
+    from scheduler import PRIORITY_BACKGROUND, request_priority
+    from utils import ask_gpt_with_data, ask_gpt_with_query
+
+    record = {"type": "answer", "file": os.path.basename(path), "question": question,
+              "answer": None, "error": None}
+    try:
+        # A worker already parsed the file, so this normally reads its Parquet spill
+        df, digest, sheet = load_file(path)
+        record.update(digest=digest, sheet=sheet)
+        ask = ask_gpt_with_query if exact else ask_gpt_with_data
+        with request_priority(PRIORITY_BACKGROUND):
+            record["answer"] = ask(question, df)
+    except Exception as e:
+        record["error"] = str(e)
+    record["finished_at"] = datetime.now().isoformat()
+    return record
+
+
+class ResultLog:
+    """Append-only JSONL of finished work; also the resume state"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: List[Dict] = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.records.append(json.loads(line))
+                    except ValueError:
+                        continue  # Line cut short by a crash
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, record: Dict) -> None:
+        self.records.append(record)
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+    def done_files(self) -> Set[Tuple[str, str]]:
+        """(file name, digest) of files analyzed without error"""
+        return {(r["file"], r.get("digest")) for r in self.records if r["type"] == "file" and not r.get("error")}
+
+    def done_answers(self) -> Set[Tuple[str, str, str]]:
+        """(file name, digest, question) answered without error"""
+        return {(r["file"], r.get("digest"), r["question"])
+                for r in self.records if r["type"] == "answer" and not r.get("error")}
+
+    def latest(self) -> Tuple[Dict[str, Dict], Dict[str, Dict[str, Dict]]]:
+        """Last record per file and per (file, question), later runs winning"""
+        files, answers = {}, {}
+        for r in self.records:
+            if r["type"] == "file":
+                files[r["file"]] = r
+            elif r["type"] == "answer":
+                answers.setdefault(r["file"], {})[r["question"]] = r
+        return files, answers
+
+
+def write_report(log: ResultLog, path: str, questions: List[str]) -> None:
+    """Markdown report of the latest result of every file and question"""
+    files, answers = log.latest()
+    lines = ["# Batch analysis report", "", f"Generated {datetime.now().strftime('%Y-%m-%d %H:%M')} "
+             f"for {len(files)} files and {len(questions)} questions.", ""]
+    for name in sorted(files):
+        record = files[name]
+        lines += [f"## {name}", ""]
+        if record.get("error"):
+            lines += [f"⚠️ Analysis failed: {record['error']}", ""]
+            continue
+        lines += [record["analysis"].strip(), "", "<details><summary>Data summary</summary>", "",
+                  record["summary"], "", "</details>", ""]
+        for question in questions:
+            answer = answers.get(name, {}).get(question)
+            if answer is None:
+                continue
+            lines += [f"### {question}", ""]
+            lines += [answer["answer"] if not answer.get("error") else f"⚠️ {answer['error']}", ""]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    os.replace(tmp_path, path)
+
+
+def run_batch(directory: str, questions: List[str], out_dir: str, workers: int,
+              llm_concurrency: int, exact: bool = True) -> Dict[str, int]:
+    """
+    Analyze every file in directory and answer each question about each file
+    Files already completed in out_dir (same name and content) are skipped,
+    as are questions already answered for them.
+    Returns:
+        dict: Counts of analyzed, skipped and failed files and answers
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    log = ResultLog(os.path.join(out_dir, RESULTS_FILE))
+    done_files, done_answers = log.done_files(), log.done_answers()
+    stats = {"files": 0, "files_skipped": 0, "files_failed": 0,
+             "answers": 0, "answers_skipped": 0, "answers_failed": 0}
+
+    pending: Dict[Future, Tuple[str, str]] = {}
+    try:
+        # Spawned, not forked: the parent already runs LLM and client threads
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as processes, \
+                ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="llm") as llm:
+
+            def submit_questions(path: str, digest: str) -> None:
+                for question in questions:
+                    if (os.path.basename(path), digest, question) in done_answers:
+                        stats["answers_skipped"] += 1
+                        continue
+                    pending[llm.submit(answer_question, path, question, exact)] = ("answer", path)
+
+            for path in find_files(directory):
+                digest = file_digest(path)
+                if (os.path.basename(path), digest) in done_files:
+                    stats["files_skipped"] += 1
+                    submit_questions(path, digest)
+                else:
+                    pending[processes.submit(analyze_file, path)] = ("file", path)
+
+            while pending:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    kind, path = pending.pop(future)
+                    record = future.result()
+                    log.append(record)
+                    failed = bool(record.get("error"))
+                    if kind == "file":
+                        stats["files_failed" if failed else "files"] += 1
+                        if not failed:
+                            submit_questions(path, record["digest"])
+                    else:
+                        stats["answers_failed" if failed else "answers"] += 1
+                    print(f"[{kind}] {os.path.basename(path)}"
+                          f"{': ' + record['question'][:60] if kind == 'answer' else ''}"
+                          f"{' FAILED: ' + record['error'] if failed else ''}", file=sys.stderr)
+    finally:
+        write_report(log, os.path.join(out_dir, REPORT_FILE), questions)
+        log.close()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a directory of CSV/XLSX logistics exports")
+    parser.add_argument("directory", help="folder with .csv/.xlsx/.xls files")
+    parser.add_argument("--questions", help="text file with one question per line")
+    parser.add_argument("-q", "--question", action="append", default=[], help="question (repeatable)")
+    parser.add_argument("--out", default="batch_reports", help="output folder (reused to resume)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="parsing processes")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="simultaneous LLM requests")
+    parser.add_argument("--no-exact", action="store_true",
+                        help="answer from the data summary instead of locally computed query results")
+    args = parser.parse_args(argv)
+
+    questions = read_questions(args.questions, args.question)
+    stats = run_batch(args.directory, questions, args.out, max(1, args.workers),
+                      max(1, args.llm_concurrency), exact=not args.no_exact)
+    print(json.dumps(stats), file=sys.stderr)
+    print(os.path.join(args.out, REPORT_FILE))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Benchmarks of the chat hot paths against a local stub LLM
+
+Runs fully offline and writes machine-readable JSON for comparing runs:
+    python benchmark.py --quick --output bench.json
+    python benchmark.py --rows 1000 100000 5000000 --messages 10 10000 --latency 0.2
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from stub_llm import StubConfig, StubLLMServer
+
+DEFAULT_ROWS = [1_000, 10_000, 100_000, 1_000_000, 5_000_000]
+QUICK_ROWS = [1_000, 10_000]
+DEFAULT_MESSAGES = [10, 100, 1_000, 10_000]
+QUICK_MESSAGES = [10, 100]
+
+
+def make_logistics_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic shipment data with the columns the analyzers look for"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Order ID": np.arange(rows),
+        "Order Date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h"),
+        "Country": rng.choice(["Vietnam", "Germany", "United States", "Japan", "Brazil", "India"], rows),
+        "Destination": rng.choice([f"City {i}" for i in range(300)], rows),
+        "Carrier": rng.choice(["DHL", "UPS", "FedEx", "Maersk", "DB Schenker"], rows),
+        "SKU": rng.choice([f"SKU-{i:05d}" for i in range(5000)], rows),
+        "Status": rng.choice(["Delivered", "Delayed", "In transit", "Cancelled"], rows, p=[0.7, 0.15, 0.1, 0.05]),
+        "Order Value": rng.gamma(2.0, 150.0, rows).round(2),
+        "Shipping Cost": rng.gamma(2.0, 20.0, rows).round(2),
+        "Weight (kg)": rng.gamma(1.5, 8.0, rows).round(1),
+    })
+
+
+def make_conversation(messages: int) -> List[Dict]:
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i}: " + "shipment cost analysis " * (5 if i % 2 == 0 else 60),
+            "timestamp": datetime.now().isoformat(),
+        }
+        for i in range(messages)
+    ]
+
+
+def measure(name: str, fn: Callable[[], object], repeat: int, **params) -> Dict:
+    """Time fn repeat times and summarize the wall-clock durations"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    result = {
+        "name": name,
+        "params": params,
+        "runs": repeat,
+        "min_s": min(durations),
+        "median_s": statistics.median(durations),
+        "mean_s": statistics.fmean(durations),
+        "max_s": max(durations),
+    }
+    print(f"{name:<32} {json.dumps(params):<40} median {result['median_s'] * 1000:10.2f} ms", file=sys.stderr)
+    return result
+
+
+def bench_dataframes(args, workdir: str) -> List[Dict]:
+    import utils
+    from ingest import parse_file, load_uploaded_file, clear_ingest_cache
+    from excel_analyzer import analyze_order_file
+
+    results = []
+    for rows in args.rows:
+        df = make_logistics_frame(rows)
+        results.append(measure("summarize_data.cold", lambda: utils.summarize_data(df, use_cache=False),
+                               args.repeat, rows=rows))
+        utils.summarize_data(df)
+        results.append(measure("summarize_data.cached", lambda: utils.summarize_data(df), args.repeat, rows=rows))
+
+        csv_bytes = df.to_csv(index=False).encode("utf-8")
+        results.append(measure("ingest.csv.parse", lambda: parse_file("data.csv", csv_bytes),
+                               args.repeat, rows=rows, mb=round(len(csv_bytes) / 2**20, 1)))
+        clear_ingest_cache()
+        load_uploaded_file("data.csv", csv_bytes)
+        results.append(measure("ingest.csv.cached", lambda: load_uploaded_file("data.csv", csv_bytes),
+                               args.repeat, rows=rows))
+
+        if rows <= args.excel_max_rows:
+            buffer = io.BytesIO()
+            df.to_excel(buffer, index=False)
+            xlsx_bytes = buffer.getvalue()
+            results.append(measure("ingest.excel.parse", lambda: parse_file("data.xlsx", xlsx_bytes),
+                                   args.repeat, rows=rows, mb=round(len(xlsx_bytes) / 2**20, 1)))
+            path = os.path.join(workdir, f"orders_{rows}.xlsx")
+            with open(path, "wb") as f:
+                f.write(xlsx_bytes)
+            clear_ingest_cache()
+            results.append(measure("analyze_order_file.cold", lambda: (clear_ingest_cache(), analyze_order_file(path)),
+                                   1, rows=rows))
+            results.append(measure("analyze_order_file.warm", lambda: analyze_order_file(path), args.repeat, rows=rows))
+
+        if rows <= args.llm_max_rows:
+            question = "What is the total shipping cost by carrier for delayed orders?"
+            results.append(measure(
+                "ask_gpt_with_data.e2e",
+                lambda: utils.ask_gpt_with_data(question, df, use_cache=False),
+                args.repeat, rows=rows, latency_s=args.latency,
+            ))
+            results.append(measure(
+                "ask_gpt_with_data_stream.e2e",
+                lambda: "".join(utils.ask_gpt_with_data_stream(question, df, use_cache=False)),
+                args.repeat, rows=rows, latency_s=args.latency, token_delay_s=args.token_delay,
+            ))
+    return results
+
+
+def bench_history(args, workdir: str) -> List[Dict]:
+    import utils
+    from storage import ConversationStore
+
+    results = []
+    for messages in args.messages:
+        history = make_conversation(messages)
+        path = os.path.join(workdir, f"history_{messages}.json")
+        results.append(measure("save_chat_history", lambda: utils.save_chat_history(history, path),
+                               args.repeat, messages=messages))
+        results.append(measure("get_chat_history", lambda: utils.get_chat_history(path),
+                               args.repeat, messages=messages))
+
+        store = ConversationStore(os.path.join(workdir, f"store_{messages}.db"))
+        store.append_messages("bench", history)
+        turn = history[-2:]
+        results.append(measure("store.append_turn", lambda: store.append_messages("bench", turn),
+                               args.repeat, messages=messages))
+        results.append(measure("store.load_recent_50", lambda: store.load_messages("bench", limit=50),
+                               args.repeat, messages=messages))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the logistics chatbot hot paths offline")
+    parser.add_argument("--rows", type=int, nargs="+", default=None, help=f"dataset sizes (default {DEFAULT_ROWS})")
+    parser.add_argument("--messages", type=int, nargs="+", default=None,
+                        help=f"conversation lengths (default {DEFAULT_MESSAGES})")
+    parser.add_argument("--quick", action="store_true", help="small sizes only, for a fast smoke run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub LLM seconds to first byte")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="stub LLM seconds between chunks")
+    parser.add_argument("--excel-max-rows", type=int, default=100_000, help="skip Excel above this size")
+    parser.add_argument("--llm-max-rows", type=int, default=1_000_000, help="skip end-to-end LLM above this size")
+    parser.add_argument("--output", default="-", help="JSON output path, '-' for stdout")
+    args = parser.parse_args(argv)
+    args.rows = args.rows or (QUICK_ROWS if args.quick else DEFAULT_ROWS)
+    args.messages = args.messages or (QUICK_MESSAGES if args.quick else DEFAULT_MESSAGES)
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            StubLLMServer(config=StubConfig(latency=args.latency, token_delay=args.token_delay)) as stub:
+        # Must be set before utils / llm_client are imported
+        os.environ["GROQ_BASE_URL"] = stub.base_url
+        os.environ["GROQ_API_KEY"] = "benchmark"
+        os.environ["CHAT_DB_PATH"] = os.path.join(workdir, "chat_store.db")
+        os.environ["RESPONSE_CACHE_PATH"] = os.path.join(workdir, "response_cache.db")
+        os.environ["INGEST_SPILL_DIR"] = os.path.join(workdir, "spill")
+
+        started = time.perf_counter()
+        results = bench_dataframes(args, workdir) + bench_history(args, workdir)
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "args": vars(args),
+                "total_s": time.perf_counter() - started,
+            },
+            "results": results,
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
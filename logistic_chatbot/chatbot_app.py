@@ -2,8 +2,12 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
 import openai
 import os
+import queue
 import shutil
-from utils import ask_gpt
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import ask_gpt_stream
 from excel_analyzer import analyze_order_file
 
 
@@ -12,6 +16,11 @@ os.makedirs("history", exist_ok=True)
 os.makedirs("uploads", exist_ok=True)
 
 
+HISTORY_FILE = "history/chat_history.txt"
+MAX_WORKERS = 4
+POLL_INTERVAL_MS = 50
+
+
 class ChatbotApp:
     def __init__(self, root):
         self.root = root
@@ -23,6 +32,14 @@ class ChatbotApp:
         self.dark_mode = False  # Dark mode status
 
 
+        # Background workers post ("token" | "done" | "error", request_id, payload) events here;
+        # only the Tk main thread touches widgets, via _poll_events
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        self.events = queue.Queue()
+        self.request_ids = itertools.count(1)
+        self.pending = {}  # request_id -> {"future", "cancel", "mark", "chunks"}
+
+
         # Title
         title = tk.Label(root, text="Logistics Chatbot", font=("Helvetica", 20, "bold"), bg="#f0f2f5")
         title.pack(pady=10)
@@ -52,6 +69,10 @@ class ChatbotApp:
         send_btn.grid(row=0, column=1, padx=5)
 
 
+        self.stop_btn = tk.Button(input_frame, text="Stop", command=self.cancel_all, bg="#F44336", fg="white", font=("Helvetica", 12, "bold"), state=tk.DISABLED)
+        self.stop_btn.grid(row=0, column=2, padx=5)
+
+
         upload_btn = tk.Button(root, text="📄 Upload Excel", command=self.upload_file, bg="#2196F3", fg="white", font=("Helvetica", 12, "bold"))
         upload_btn.pack(pady=5)
 
@@ -78,6 +99,10 @@ class ChatbotApp:
             btn.grid(row=idx // 2, column=idx % 2, padx=5, pady=5)
 
 
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(POLL_INTERVAL_MS, self._poll_events)
+
+
     def toggle_theme(self):
         if self.dark_mode:
             self.root.configure(bg="#f0f2f5")
@@ -97,17 +122,48 @@ class ChatbotApp:
 
 
         self.display_message("You", user_message)
+        self.input_entry.delete(0, tk.END)
 
 
-        bot_response = ask_gpt(user_message)
-        self.display_message("Bot", bot_response)
+        # The answer streams into its own slot while the window stays responsive
+        self.submit(self._stream_answer, user_message)
 
 
-        self.input_entry.delete(0, tk.END)
+    def submit(self, task, *args):
+        """Run task(request_id, cancel_event, *args) on the worker pool"""
+        request_id = next(self.request_ids)
+        mark = self._open_bot_slot(request_id)
+        cancel = threading.Event()
+        future = self.executor.submit(self._run_task, task, request_id, cancel, *args)
+        self.pending[request_id] = {"future": future, "cancel": cancel, "mark": mark, "chunks": []}
+        self.stop_btn.config(state=tk.NORMAL)
+        return request_id
+
+
+    def _run_task(self, task, request_id, cancel, *args):
+        try:
+            task(request_id, cancel, *args)
+        except Exception as e:
+            self.events.put(("error", request_id, str(e)))
+
+
+    def _stream_answer(self, request_id, cancel, question):
+        stream = ask_gpt_stream(question)
+        try:
+            for chunk in stream:
+                if cancel.is_set():
+                    break
+                self.events.put(("token", request_id, chunk))
+        finally:
+            stream.close()  # Releases the upstream connection when cancelled
+        self.events.put(("done", request_id, "[cancelled]" if cancel.is_set() else None))
 
 
-        # Save history
-        self.save_chat()
+    def _analyze_file(self, request_id, cancel, dest_path):
+        result = analyze_order_file(dest_path)
+        if not cancel.is_set():
+            self.events.put(("token", request_id, result))
+        self.events.put(("done", request_id, None))
 
 
     def upload_file(self):
@@ -118,75 +174,102 @@ class ChatbotApp:
             try:
                 dest_path = os.path.join("uploads", os.path.basename(file_path))
                 shutil.copy(file_path, dest_path)
-                result = analyze_order_file(dest_path)
-                self.display_message("Bot", result)
+                self.submit(self._analyze_file, dest_path)
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to upload file: {e}")
 
 
-    def display_message(self, sender, message):
+    def cancel_all(self):
+        for request_id, request in list(self.pending.items()):
+            request["cancel"].set()
+            if request["future"].cancel():
+                # Never started, so no worker will report back for it
+                self.events.put(("done", request_id, "[cancelled]"))
+
+
+    def _open_bot_slot(self, request_id):
+        """Insert "Bot: " and a mark where this request's tokens will be inserted"""
+        mark = f"request_{request_id}"
         self.chat_area.config(state=tk.NORMAL)
-        self.chat_area.insert(tk.END, f"{sender}: {message}\n\n")
+        self.chat_area.insert(tk.END, "Bot: ")
+        self.chat_area.mark_set(mark, "end-1c")
+        self.chat_area.mark_gravity(mark, tk.LEFT)
+        self.chat_area.insert(tk.END, "\n\n")
+        # From now on text inserted at the mark pushes it forward
+        self.chat_area.mark_gravity(mark, tk.RIGHT)
         self.chat_area.config(state=tk.DISABLED)
         self.chat_area.see(tk.END)
+        return mark
 
 
-    def save_chat(self):
-        chat_text = self.chat_area.get("1.0", tk.END)
-        with open("history/chat_history.txt", "w", encoding="utf-8") as f:
-            f.write(chat_text)
-
-
-    def quick_question(self, question):
-        self.input_entry.delete(0, tk.END)
-        self.input_entry.insert(0, question)
-        self.send_message()
-
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = ChatbotApp(root)
-    root.mainloop()
-
-
-
-
-
+    def _poll_events(self):
+        try:
+            while True:
+                kind, request_id, payload = self.events.get_nowait()
+                self._handle_event(kind, request_id, payload)
+        except queue.Empty:
+            pass
+        self.root.after(POLL_INTERVAL_MS, self._poll_events)
 
 
-excel_analyzer.py
-import pandas as pd
-
-
-def analyze_order_file(filepath):
-    try:
-        df = pd.read_excel(filepath)
-
-
-        summary = f"✅ File loaded successfully with {len(df)} records.\n"
+    def _handle_event(self, kind, request_id, payload):
+        request = self.pending.get(request_id)
+        if request is None:
+            self._refresh_stop_button()
+            return
+        if kind == "token":
+            request["chunks"].append(payload)
+            self._insert_at(request["mark"], payload)
+            return
+        if kind == "error":
+            payload = f"[error: {payload}]"
+            self._insert_at(request["mark"], payload)
+        elif payload:
+            self._insert_at(request["mark"], f" {payload}")
+        self.chat_area.mark_unset(request["mark"])
+        del self.pending[request_id]
+        self.save_chat("Bot", "".join(request["chunks"]) or payload or "")
+        self._refresh_stop_button()
+
+
+    def _insert_at(self, mark, text):
+        self.chat_area.config(state=tk.NORMAL)
+        self.chat_area.insert(mark, text)
+        self.chat_area.config(state=tk.DISABLED)
+        self.chat_area.see(mark)
 
 
-        if 'Order Date' in df.columns:
-            df['Order Date'] = pd.to_datetime(df['Order Date'])
-            earliest = df['Order Date'].min().date()
-            latest = df['Order Date'].max().date()
-            summary += f"• Orders from {earliest} to {latest}\n"
+    def _refresh_stop_button(self):
+        self.stop_btn.config(state=tk.NORMAL if self.pending else tk.DISABLED)
 
 
-        if 'Country' in df.columns:
-            countries = df['Country'].nunique()
-            summary += f"• Delivered to {countries} countries\n"
+    def on_close(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False)
+        self.root.destroy()
 
 
-        if 'Order Value' in df.columns:
-            total_value = df['Order Value'].sum()
-            summary += f"• Total Order Value: ${total_value:,.2f}\n"
+    def display_message(self, sender, message):
+        self.chat_area.config(state=tk.NORMAL)
+        self.chat_area.insert(tk.END, f"{sender}: {message}\n\n")
+        self.chat_area.config(state=tk.DISABLED)
+        self.chat_area.see(tk.END)
+        self.save_chat(sender, message)
 
 
-        return summary
-    except Exception as e:
-        return f"Error analyzing file: {e}"
+    def save_chat(self, sender, message):
+        # Append only the new message instead of rewriting the whole transcript
+        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+            f.write(f"{sender}: {message}\n\n")
 
 
+    def quick_question(self, question):
+        self.input_entry.delete(0, tk.END)
+        self.input_entry.insert(0, question)
+        self.send_message()
 
 
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = ChatbotApp(root)
+    root.mainloop()
@@ -0,0 +1,174 @@
+import os
+import re
+import hashlib
+from typing import Callable, Dict, List, Optional
+
+from cache import LRUCache
+
+# Context windows (tokens) of the models we call
+MODEL_CONTEXT_TOKENS = {
+    "llama3-70b-8192": 8192,
+    "llama3-8b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+CONTEXT_SAFETY_TOKENS = 64  # Role markers and counting error
+SUMMARY_MAX_SHARE = 0.25  # Rolling summary share of what is left for history
+TURN_MAX_TOKENS = int(os.getenv("CONTEXT_TURN_MAX_TOKENS", "600"))
+HISTORY_MIN_TOKENS = int(os.getenv("CONTEXT_HISTORY_MIN_TOKENS", "600"))  # Kept free for history when data is large
+HISTORY_MAX_MESSAGES = int(os.getenv("CONTEXT_HISTORY_MAX_MESSAGES", "60"))  # Most messages folded from scratch
+FOLD_INPUT_TOKENS = 3000  # Transcript size of one summarization call
+
+SUMMARY_SYSTEM_CONTENT = """You maintain a running summary of a logistics analysis conversation.
+        Keep the questions asked, the figures and conclusions given, and open follow-ups. Be brief."""
+
+# Letter runs of up to six, digit groups of up to three and short punctuation
+# runs; within ~20% of the Llama 3 tokenizer on prose and markdown tables
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]{1,6}|\d{1,3}|[^\w\s]{1,3}|_")
+
+# conversation key -> {"hashes", "summary"}: one hash per turn folded so far
+_rolling_summaries = LRUCache(max_entries=int(os.getenv("CONTEXT_SUMMARY_CACHE_ENTRIES", "512")))
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Local token estimate; no tokenizer download or API call"""
+    return len(_TOKEN_PATTERN.findall(text or ""))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens tokens, marking the cut"""
+    if max_tokens <= 0:
+        return ""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = int(len(text) * (max_tokens - 8) / tokens)
+    return text[:max(0, keep)].rstrip() + "\n... (truncated)"
+
+
+def prompt_budget(model: str, max_output_tokens: int) -> int:
+    """Tokens available for the request messages"""
+    window = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    return max(256, window - max_output_tokens - CONTEXT_SAFETY_TOKENS)
+
+
+def _turns(history: Optional[List[Dict]]) -> List[Dict]:
+    """User/assistant messages worth replaying, oldest first"""
+    return [m for m in (history or []) if m.get("role") in ("user", "assistant") and m.get("content")]
+
+
+def _turn_hash(m: Dict) -> str:
+    return hashlib.blake2b(f"{m['role']}\0{m['content']}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+def history_digest(history: Optional[List[Dict]]) -> str:
+    """Stable digest of the turns build_messages would draw on ("" when there are none)"""
+    turns = _turns(history)
+    if not turns:
+        return ""
+    return hashlib.blake2b("".join(_turn_hash(m) for m in turns).encode("ascii"),
+                           digest_size=16).hexdigest()
+
+
+def _transcript(turns: List[Dict]) -> List[str]:
+    return [f"{m['role'].upper()}: {truncate_tokens(m['content'], TURN_MAX_TOKENS // 2)}" for m in turns]
+
+
+def _fold(previous: str, turns: List[Dict], summarize: Callable[[str], str]) -> str:
+    """Extend a summary with more turns, one window-sized batch per call"""
+    summary = previous
+    lines = _transcript(turns)
+    while lines:
+        batch, size = [], count_tokens(summary)
+        while lines and (not batch or size + count_tokens(lines[0]) <= FOLD_INPUT_TOKENS):
+            size += count_tokens(lines[0])
+            batch.append(lines.pop(0))
+        request = (f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n" + "\n".join(batch)
+                   + "\n\nReturn the updated summary in at most 200 words.")
+        try:
+            summary = summarize(request)
+        except Exception:
+            # Without the model, keep the opening of each message so the thread is not lost
+            summary = "\n".join(filter(None, [summary] + [truncate_tokens(line, 40) for line in batch]))
+    return summary
+
+
+def rolling_summary(turns: List[Dict], summarize: Callable[[str], str],
+                    conversation_id: Optional[str] = None) -> str:
+    """
+    Summary of turns that no longer fit the window, cached per conversation
+    Only turns added since the cached summary are sent to the model; without
+    a usable cached summary just the last HISTORY_MAX_MESSAGES are folded.
+    Callers with different budgets ask for different prefixes of the same
+    conversation, so the longest summary is kept and reused for shorter
+    prefixes (it then also covers a few turns replayed verbatim).
+    """
+    if not turns:
+        return ""
+    hashes = [_turn_hash(m) for m in turns]
+    key = conversation_id or history_digest(turns)
+    entry = _rolling_summaries.get(key)
+    cached = entry["hashes"] if entry is not None else []
+    if len(cached) >= len(hashes) and cached[:len(hashes)] == hashes:
+        return entry["summary"]
+    if cached and cached == hashes[:len(cached)]:
+        summary = _fold(entry["summary"], turns[len(cached):], summarize)
+    else:
+        summary = _fold("", turns[-HISTORY_MAX_MESSAGES:], summarize)
+    _rolling_summaries.put(key, {"hashes": hashes, "summary": summary})
+    return summary
+
+
+def build_messages(prompt: str, system_content: str, history: Optional[List[Dict]] = None,
+                   model: str = "", max_output_tokens: int = 4000,
+                   summarize: Optional[Callable[[str], str]] = None,
+                   conversation_id: Optional[str] = None) -> List[Dict]:
+    """
+    Assemble chat messages that fit the model's context window
+    The system message (data context included there once) and the current
+    prompt come first; when both do not fit, the larger one is cut. A little
+    room is kept for history, filled with as many recent turns as fit,
+    newest first. Older turns are folded into a rolling summary when
+    summarize is given.
+    Args:
+        prompt: Current user message
+        system_content: System message, including any data context
+        history: Earlier messages of the conversation, oldest first (without prompt)
+        model: Model name, for its context window
+        max_output_tokens: Tokens reserved for the answer
+        summarize: Function sending a summarization request to the model
+        conversation_id: Key of the cached rolling summary
+    Returns:
+        list: Messages ready for chat.completions
+    """
+    budget = prompt_budget(model, max_output_tokens)
+    turns = _turns(history)
+    reserve = min(HISTORY_MIN_TOKENS, sum(count_tokens(m["content"]) for m in turns), budget // 4)
+    available = budget - reserve
+    prompt = truncate_tokens(prompt, available - min(count_tokens(system_content), available // 2))
+    system_content = truncate_tokens(system_content, available - count_tokens(prompt))
+    remaining = budget - count_tokens(prompt) - count_tokens(system_content)
+
+    recent: List[Dict] = []
+    summary_budget = int(remaining * SUMMARY_MAX_SHARE) if summarize is not None else 0
+    history_budget = remaining - summary_budget
+    for m in reversed(turns):
+        content = truncate_tokens(m["content"], TURN_MAX_TOKENS)
+        cost = count_tokens(content) + 4
+        if cost > history_budget:
+            break
+        recent.insert(0, {"role": m["role"], "content": content})
+        history_budget -= cost
+
+    messages = [{"role": "system", "content": system_content}]
+    older = turns[:len(turns) - len(recent)]
+    if older and summarize is not None:
+        summary = truncate_tokens(rolling_summary(older, summarize, conversation_id), summary_budget)
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    # The API expects the replayed turns to start with the user
+    while recent and recent[0]["role"] != "user":
+        recent.pop(0)
+    messages += recent
+    messages.append({"role": "user", "content": prompt})
+    return messages
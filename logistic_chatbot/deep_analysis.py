@@ -0,0 +1,182 @@
+import os
+import math
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+import tracing
+from cache import frame_fingerprint
+from kpi_cube import detect_roles
+from scheduler import PRIORITY_BACKGROUND, request_priority
+from utils import (
+    ChatbotError,
+    DEFAULT_DATA_SYSTEM_CONTENT,
+    ask_gpt,
+    ask_gpt_stream,
+    summarize_data
+)
+
+DEEP_MAX_WORKERS = int(os.getenv("DEEP_MAX_WORKERS", "6"))
+DEEP_MAX_PARTITIONS = int(os.getenv("DEEP_MAX_PARTITIONS", "12"))
+DEEP_COLUMN_GROUP_SIZE = int(os.getenv("DEEP_COLUMN_GROUP_SIZE", "12"))
+# llama3-70b-8192 has 8192 tokens of context and up to 4000 go to the answer,
+# so each prompt stays under ~4000 tokens (about four characters per token)
+DEEP_MAX_PROMPT_CHARS = int(os.getenv("DEEP_MAX_PROMPT_CHARS", "14000"))
+MAP_ANSWER_WORDS = 150
+PARTITION_MODES = ("auto", "columns", "month", "dimension")
+
+MAP_SYSTEM_CONTENT = """You are an expert logistics data analyst examining one slice of a larger dataset.
+        Report only what this slice shows, with specific numbers."""
+
+
+def _fit(text: str, limit: int) -> str:
+    """Cut text to limit characters, marking the cut"""
+    if len(text) <= limit:
+        return text
+    return text[:max(0, limit - 20)].rstrip() + "\n... (truncated)"
+
+
+def _column_groups(df: pd.DataFrame, roles: Dict) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    Slices of about DEEP_COLUMN_GROUP_SIZE columns, each repeating the date and first dimension
+    Very wide sheets get wider groups rather than more than DEEP_MAX_PARTITIONS, so every column is covered.
+    """
+    keys = [c for c in [roles["date"], next(iter(roles["dimensions"].values()), None)] if c is not None]
+    rest = [c for c in df.columns if c not in keys]
+    size = max(1, DEEP_COLUMN_GROUP_SIZE - len(keys), math.ceil(len(rest) / DEEP_MAX_PARTITIONS))
+    groups = [rest[i:i + size] for i in range(0, len(rest), size)]
+    return [(f"Columns {', '.join(map(str, group[:3]))}{', ...' if len(group) > 3 else ''}", df[keys + group])
+            for group in groups]
+
+
+def _row_partitions(df: pd.DataFrame, keys: pd.Series, label: str) -> List[Tuple[str, pd.DataFrame]]:
+    """One slice per key value; beyond DEEP_MAX_PARTITIONS the smallest are merged into "Other" """
+    counts = keys.value_counts()
+    top = list(counts.index[:DEEP_MAX_PARTITIONS - 1]) if len(counts) > DEEP_MAX_PARTITIONS else list(counts.index)
+    parts = [(f"{label} {value}", df[(keys == value).to_numpy()]) for value in sorted(top, key=str)]
+    if len(counts) > len(top):
+        parts.append((f"{label} (other values)", df[(~keys.isin(top)).to_numpy()]))
+    return parts
+
+
+def plan_partitions(df: pd.DataFrame, by: str = "auto") -> Tuple[str, List[Tuple[str, pd.DataFrame]]]:
+    """
+    Split a dataset into slices that are analyzed independently
+    Args:
+        df: Full dataset
+        by: "columns" (column groups), "month", "dimension" (first detected dimension,
+            e.g. region or carrier) or "auto": column groups for wide sheets,
+            otherwise months, otherwise the first dimension
+    Returns:
+        tuple: (mode used, [(label, slice), ...]); a single whole-frame slice if nothing applies
+    """
+    if by not in PARTITION_MODES:
+        raise ChatbotError(f"Unknown partitioning: {by}")
+    roles = detect_roles(df)
+    if by == "auto":
+        if len(df.columns) > DEEP_COLUMN_GROUP_SIZE:
+            by = "columns"
+        elif roles["date"] is not None:
+            by = "month"
+        else:
+            by = "dimension"
+
+    if by == "columns" and len(df.columns) > DEEP_COLUMN_GROUP_SIZE:
+        return by, _column_groups(df, roles)
+    if by == "month" and roles["date"] is not None:
+        dates = pd.to_datetime(df[roles["date"]], errors="coerce")
+        months = dates.dt.to_period("M").astype(str).where(dates.notna(), "unknown date")
+        return by, _row_partitions(df, months, "Month")
+    if by == "dimension" and roles["dimensions"]:
+        column = next(iter(roles["dimensions"].values()))
+        return by, _row_partitions(df, df[column].astype(str), str(column))
+    return "none", [("All data", df)]
+
+
+def _map_prompt(prompt: str, label: str, part: pd.DataFrame, total_rows: int) -> str:
+    header = (f"Slice: {label} ({len(part)} of {total_rows} rows; "
+              f"columns: {', '.join(map(str, part.columns))})\n")
+    footer = (f"\nQuestion: {prompt}\n"
+              f"Answer for this slice only, in at most {MAP_ANSWER_WORDS} words, with specific numbers.")
+    budget = DEEP_MAX_PROMPT_CHARS - len(MAP_SYSTEM_CONTENT) - len(header) - len(footer)
+    return header + _fit(summarize_data(part, use_cache=False), budget) + footer
+
+
+def _reduce_prompt(prompt: str, mode: str, findings: List[Tuple[str, str]], df: pd.DataFrame,
+                   system_content: str) -> str:
+    header = (f"The question below was analyzed separately on {len(findings)} slices of a logistics dataset "
+              f"({len(df)} rows x {len(df.columns)} columns, split by {mode}).\n"
+              f"Partial findings:\n")
+    footer = (f"\nQuestion: {prompt}\n"
+              f"Combine the partial findings into one answer: compare the slices, total figures where "
+              f"they add up, and call out the notable differences and their likely causes.")
+    budget = DEEP_MAX_PROMPT_CHARS - len(system_content) - len(header) - len(footer)
+    per_slice = max(200, budget // max(1, len(findings)))
+    body = "\n".join(f"#### {label}\n{_fit(answer, per_slice)}" for label, answer in findings)
+    return header + _fit(body, budget) + footer
+
+
+def ask_gpt_deep_stream(prompt: str, df: pd.DataFrame, system_content: str = None, by: str = "auto",
+                        use_cache: bool = True, history: Optional[List[Dict]] = None,
+                        conversation_id: Optional[str] = None,
+                        on_progress: Optional[Callable[[int, int, str], None]] = None) -> Tuple[Iterator[str], Dict]:
+    """
+    Map-reduce answer for wide or long datasets
+    Every slice is summarized and asked about concurrently (map), then the
+    partial findings are merged by one streamed call (reduce). Each prompt is
+    kept under DEEP_MAX_PROMPT_CHARS.
+    Args:
+        prompt: User question
+        df: Full dataset
+        system_content: Optional custom system message for the final answer
+        by: Partitioning, see plan_partitions
+        use_cache: Set False to bypass the response cache
+        history: Earlier messages of the conversation, given to the final call only
+        conversation_id: Conversation the history belongs to
+        on_progress: Called as (finished slices, total slices, label) from the calling thread
+    Returns:
+        tuple: (chunk iterator of the merged answer,
+                {"mode", "partitions", "failed"} describing the map stage)
+    """
+    system_content = system_content or DEFAULT_DATA_SYSTEM_CONTENT
+    try:
+        fingerprint = frame_fingerprint(df)
+        mode, parts = plan_partitions(df, by)
+    except ChatbotError:
+        raise
+    except Exception as e:
+        raise ChatbotError(f"Data summarization error: {str(e)}")
+
+    parent = tracing.current_span()
+
+    def run_map(label: str, part: pd.DataFrame) -> str:
+        # Map calls run on pool threads; keep them in the caller's trace, queued behind chat turns
+        with tracing.activate(parent) if parent is not None else nullcontext(), \
+                request_priority(PRIORITY_BACKGROUND):
+            with tracing.span("deep.map", partition=label, rows=len(part), columns=len(part.columns)):
+                return ask_gpt(_map_prompt(prompt, label, part, len(df)), MAP_SYSTEM_CONTENT,
+                               dataset_fingerprint=f"{fingerprint}:{mode}:{label}", use_cache=use_cache)
+
+    findings: Dict[str, str] = {}
+    failed: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=min(DEEP_MAX_WORKERS, len(parts)), thread_name_prefix="deep") as pool:
+        futures = {pool.submit(run_map, label, part): label for label, part in parts}
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                findings[label] = future.result()
+            except Exception as e:
+                failed[label] = str(e)
+            if on_progress is not None:
+                on_progress(len(findings) + len(failed), len(parts), label)
+    if not findings:
+        raise ChatbotError(f"Deep analysis failed for every slice: {next(iter(failed.values()), 'no data')}")
+
+    ordered = [(label, findings[label]) for label, _ in parts if label in findings]
+    reduce_prompt = _reduce_prompt(prompt, mode, ordered, df, system_content)
+    stream = ask_gpt_stream(reduce_prompt, system_content, dataset_fingerprint=f"{fingerprint}:{mode}",
+                            use_cache=use_cache, history=history, conversation_id=conversation_id)
+    return stream, {"mode": mode, "partitions": [label for label, _ in parts], "failed": failed}
+
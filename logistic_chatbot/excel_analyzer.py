@@ -0,0 +1,61 @@
+import os
+
+from ingest import default_sheet, hash_bytes, list_sheets, load_columns, load_uploaded_file, sheet_digest
+from kpi_cube import get_kpi_cube, role_candidates
+
+
+def analyze_order_file(filepath, sheet=None):
+    try:
+        name = os.path.basename(filepath)
+        with open(filepath, "rb") as f:
+            data = f.read()
+        digest = hash_bytes(data)
+        # Workbooks: list the sheets from their headers and load only the KPI columns of one
+        sheets = list_sheets(name, data, digest)
+        sheet = sheet or default_sheet(sheets)
+        header = next((s["columns"] for s in sheets if s["name"] == sheet), [])
+        columns = role_candidates(header)
+        # Parsed frames and KPI cubes are cached by file content, so re-analyzing is cheap
+        if columns:
+            df = load_columns(name, data, columns, digest, sheet)
+        else:
+            df, _ = load_uploaded_file(name, data, digest, sheet)
+        cube = get_kpi_cube(df, fingerprint=f"file:{sheet_digest(name, data, digest, sheet)}")
+
+
+        summary = f"✅ File loaded successfully with {len(df)} records.\n"
+        if len(sheets) > 1:
+            summary += f"• Workbook has {len(sheets)} sheets; analyzed '{sheet}'\n"
+
+
+        if cube.date_range:
+            earliest, latest = cube.date_range
+            summary += f"• Orders from {earliest.date()} to {latest.date()}\n"
+
+
+        if "country" in cube.distinct:
+            summary += f"• Delivered to {cube.distinct['country']} countries\n"
+        for role in ("carrier", "sku", "warehouse"):
+            if role in cube.distinct:
+                summary += f"• {cube.distinct[role]} distinct {cube.roles['dimensions'][role]} values\n"
+
+
+        totals = cube.table("totals")
+        if totals is not None:
+            for role, col in cube.roles["measures"].items():
+                total = totals.loc[col, "sum"]
+                if role == "value":
+                    summary += f"• Total {col}: ${total:,.2f}\n"
+                else:
+                    summary += f"• Total {col}: {total:,.2f}\n"
+
+
+        monthly = cube.table("monthly")
+        if monthly is not None and len(monthly) > 1:
+            busiest = monthly["orders"].idxmax()
+            summary += f"• Busiest month: {busiest} ({monthly.loc[busiest, 'orders']} orders)\n"
+
+
+        return summary
+    except Exception as e:
+        return f"Error analyzing file: {e}"
@@ -0,0 +1,417 @@
+import os
+import io
+import hashlib
+import warnings
+from typing import IO, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import tracing
+from cache import LRUCache
+from kpi_cube import DATE_KEYWORDS
+from large_file import StreamingProfile, profile_csv
+from utils import ChatbotError, validate_dataframe
+
+try:
+    import pyarrow  # noqa: F401  Optional: enables the on-disk Parquet spill
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    import python_calamine  # noqa: F401  Optional: Rust Excel reader, several times faster than openpyxl
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+# ---- Configuration ----
+INGEST_CACHE_MAX_ENTRIES = int(os.getenv("INGEST_CACHE_MAX_ENTRIES", "16"))
+INGEST_CACHE_MAX_MB = float(os.getenv("INGEST_CACHE_MAX_MB", "1024"))
+INGEST_SPILL_DIR = os.getenv("INGEST_SPILL_DIR", ".ingest_cache")
+INGEST_SPILL_ENABLED = os.getenv("INGEST_SPILL_ENABLED", "1") == "1" and HAS_PYARROW
+LARGE_FILE_CHUNK_ROWS = int(os.getenv("LARGE_FILE_CHUNK_ROWS", "100000"))
+LARGE_FILE_SAMPLE_ROWS = int(os.getenv("LARGE_FILE_SAMPLE_ROWS", "2000"))
+COMPACT_DTYPES = os.getenv("COMPACT_DTYPES", "1") == "1"
+COMPACT_CATEGORY_MAX_RATIO = float(os.getenv("COMPACT_CATEGORY_MAX_RATIO", "0.5"))  # distinct / rows
+SPILL_FORMAT_VERSION = 2  # Bumped when the stored representation changes (2: compacted dtypes)
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+# pandas reads through calamine from 2.2 on; otherwise its default (openpyxl for .xlsx)
+EXCEL_ENGINE = "calamine" if HAS_CALAMINE and tuple(map(int, pd.__version__.split(".")[:2])) >= (2, 2) else None
+
+# Parsed frames keyed by the hash of the uploaded bytes, shared by all sessions.
+# Sessions only hold a FrameHandle, so this cache is the memory budget for
+# uploaded data: idle sessions' frames are evicted first and reloaded from
+# the spill on their next question.
+_frame_cache = LRUCache(
+    max_entries=INGEST_CACHE_MAX_ENTRIES,
+    max_bytes=int(INGEST_CACHE_MAX_MB * 1024 * 1024),
+)
+# Streaming profiles of large CSVs; each holds only statistics and a bounded sample
+_profile_cache = LRUCache(max_entries=INGEST_CACHE_MAX_ENTRIES, sizeof=lambda p: p.sample.memory_usage(deep=True).sum())
+# Sheet listings of workbooks by file digest
+_sheet_cache = LRUCache(max_entries=64, sizeof=lambda sheets: 0)
+
+
+def hash_bytes(data: bytes) -> str:
+    """Content hash of an uploaded file"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def is_excel(file_name: str) -> bool:
+    return file_name.lower().endswith(EXCEL_EXTENSIONS)
+
+
+def parse_file(file_name: str, data: bytes, sheet: Optional[str] = None,
+               columns: Optional[Union[Sequence[str], Callable[[str], bool]]] = None) -> pd.DataFrame:
+    """
+    Parse CSV or Excel bytes into a dataframe
+    Args:
+        file_name: Original file name, used to pick the parser
+        data: Raw file bytes
+        sheet: Worksheet to read (the first one when None; ignored for CSV)
+        columns: Only these columns, or a predicate on column names (all when None)
+    """
+    buffer = io.BytesIO(data)
+    usecols = list(columns) if columns is not None and not callable(columns) else columns
+    if file_name.lower().endswith(".csv"):
+        return pd.read_csv(buffer, usecols=usecols)
+    return pd.read_excel(buffer, sheet_name=sheet if sheet is not None else 0, usecols=usecols,
+                         engine=EXCEL_ENGINE)
+
+
+def _read_sheet_list(file_name: str, data: bytes) -> List[Dict]:
+    if file_name.lower().endswith(".xlsx"):
+        import openpyxl
+        # Read-only mode streams each sheet; only the dimension tag and first row are read here
+        book = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            sheets = []
+            for ws in book.worksheets:
+                header = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+                header = [str(v) for v in header if v is not None]
+                rows = max(0, (ws.max_row or 1) - 1) if header else 0
+                sheets.append({"name": ws.title, "rows": rows, "columns": header})
+            return sheets
+        finally:
+            book.close()
+    # Legacy .xls has no streaming reader; the header row still avoids converting every cell
+    book = pd.ExcelFile(io.BytesIO(data), engine=EXCEL_ENGINE)
+    return [{"name": name, "rows": None, "columns": [str(c) for c in book.parse(name, nrows=0).columns]}
+            for name in book.sheet_names]
+
+
+def list_sheets(file_name: str, data: bytes, digest: Optional[str] = None) -> List[Dict]:
+    """
+    Worksheets of an Excel file with their header rows, without parsing the cells
+    Args:
+        file_name: Original file name
+        data: Raw file bytes
+        digest: Precomputed hash_bytes(data), if the caller already has it
+    Returns:
+        list: {"name", "rows" (data rows, None if unknown), "columns"} per sheet, in workbook order
+    """
+    if not is_excel(file_name):
+        return []
+    digest = digest or hash_bytes(data)
+    sheets = _sheet_cache.get(digest)
+    if sheets is None:
+        with tracing.span("ingest.sheets", file=file_name, bytes=len(data)) as span:
+            try:
+                sheets = _read_sheet_list(file_name, data)
+            except Exception as e:
+                raise ChatbotError(f"Failed to read workbook {file_name}: {str(e)}")
+            span.set(sheets=len(sheets))
+        _sheet_cache.put(digest, sheets)
+    return sheets
+
+
+def default_sheet(sheets: List[Dict]) -> Optional[str]:
+    """First sheet that has a header row (the workbook's first sheet if none does)"""
+    for sheet in sheets:
+        if sheet["columns"]:
+            return sheet["name"]
+    return sheets[0]["name"] if sheets else None
+
+
+def sheet_digest(file_name: str, data: bytes, digest: str, sheet: Optional[str]) -> str:
+    """
+    Cache key of one sheet of an upload
+    The first sheet keeps the file digest, so callers that never name a
+    sheet share parsed frames and spill files with those that pick it.
+    """
+    if sheet is None or not is_excel(file_name):
+        return digest
+    sheets = list_sheets(file_name, data, digest)
+    if sheets and sheets[0]["name"] == sheet:
+        return digest
+    return hash_bytes(f"{digest}:{sheet}".encode("utf-8"))
+
+
+def _parse_text_dates(series: pd.Series) -> Optional[pd.Series]:
+    """Parse a date-named text column, or None unless every value parses"""
+    name = str(series.name).lower()
+    if not any(keyword in name for keyword in DATE_KEYWORDS):
+        return None
+    probe = series.dropna().head(200)
+    if probe.empty:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # "Could not infer format" on mixed layouts
+        if pd.to_datetime(probe, errors="coerce").notna().mean() < 0.9:
+            return None
+        parsed = pd.to_datetime(series, errors="coerce")
+    if parsed.notna().sum() != series.notna().sum():
+        return None
+    return parsed
+
+
+def _downcast_float(series: pd.Series) -> pd.Series:
+    """
+    Whole-number float columns (e.g. Excel quantities) become small integers
+    Fractional columns stay float64: float32 would skew sums over millions of rows.
+    """
+    values = series.to_numpy()
+    if len(values) and np.isfinite(values).all() and np.array_equal(values, np.round(values)) \
+            and np.abs(values).max() < 2 ** 53:
+        return pd.to_numeric(series.astype(np.int64), downcast="integer")
+    return series
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shrink a freshly parsed frame without changing its values
+    Date-named text columns become datetimes, repetitive text becomes
+    categorical, and integers (including whole-number floats) are downcast.
+    Args:
+        df: Parsed dataframe (not modified)
+    Returns:
+        pd.DataFrame: Compacted copy
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+            columns[col] = series
+        elif pd.api.types.is_integer_dtype(series):
+            columns[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            columns[col] = _downcast_float(series)
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            dates = _parse_text_dates(series)
+            if dates is not None:
+                columns[col] = dates
+            elif len(series) and series.nunique() <= COMPACT_CATEGORY_MAX_RATIO * len(series):
+                columns[col] = series.astype("category")
+            else:
+                columns[col] = series
+        else:
+            columns[col] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _spill_path(digest: str) -> str:
+    return os.path.join(INGEST_SPILL_DIR, f"{digest}.v{SPILL_FORMAT_VERSION}.parquet")
+
+
+def _load_spill(digest: str) -> Optional[pd.DataFrame]:
+    path = _spill_path(digest)
+    if not INGEST_SPILL_ENABLED or not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        # A corrupt or incompatible spill file is just a cache miss
+        return None
+
+
+def _write_spill(digest: str, df: pd.DataFrame) -> None:
+    if not INGEST_SPILL_ENABLED:
+        return
+    path = _spill_path(digest)
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(INGEST_SPILL_DIR, exist_ok=True)
+        df.to_parquet(tmp_path, index=True)
+        os.replace(tmp_path, path)
+    except Exception:
+        # Mixed-type object columns cannot always be written; memory cache still works
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_uploaded_file(file_name: str, data: bytes, digest: Optional[str] = None,
+                       sheet: Optional[str] = None) -> Tuple[pd.DataFrame, str]:
+    """
+    Return the parsed and validated dataframe for an uploaded file
+    Parses once per distinct content (and sheet): later calls hit the
+    in-memory cache, then the on-disk Parquet spill, and only then
+    re-parse the bytes. Other sheets of a workbook are not parsed.
+    Args:
+        file_name: Original file name, used to pick the parser
+        data: Raw file bytes
+        digest: Precomputed hash_bytes(data), if the caller already has it
+        sheet: Worksheet of an Excel file (the first one when None)
+    Returns:
+        tuple: (dataframe, digest of the content and sheet)
+    """
+    with tracing.span("ingest", file=file_name, bytes=len(data), sheet=sheet) as span:
+        digest = sheet_digest(file_name, data, digest or hash_bytes(data), sheet)
+        df = _frame_cache.get(digest)
+        if df is not None:
+            span.set(source="memory", rows=len(df), columns=len(df.columns))
+            return df, digest
+
+        df = _load_spill(digest)
+        source = "spill"
+        if df is None:
+            source = "parse"
+            try:
+                df = parse_file(file_name, data, sheet)
+            except Exception as e:
+                raise ChatbotError(f"Failed to parse {file_name}: {str(e)}")
+            validate_dataframe(df)
+            if COMPACT_DTYPES:
+                df = optimize_dtypes(df)
+            _write_spill(digest, df)
+
+        _frame_cache.put(digest, df)
+        span.set(source=source, rows=len(df), columns=len(df.columns))
+        return df, digest
+
+
+def load_columns(file_name: str, data: bytes, columns: Sequence[str], digest: Optional[str] = None,
+                 sheet: Optional[str] = None) -> pd.DataFrame:
+    """
+    Only some columns of an uploaded file or sheet
+    Served from the parsed frame when it is in memory, otherwise from the
+    columnar spill reading just these columns; files not yet ingested are
+    parsed for these columns alone (kept in memory, not spilled).
+    Args:
+        file_name: Original file name
+        data: Raw file bytes
+        columns: Columns to return; names missing from the file are ignored
+        digest: Precomputed hash_bytes(data), if the caller already has it
+        sheet: Worksheet of an Excel file (the first one when None)
+    Returns:
+        pd.DataFrame: The requested columns in file order
+    """
+    with tracing.span("ingest.columns", file=file_name, sheet=sheet, columns=len(columns)) as span:
+        digest = sheet_digest(file_name, data, digest or hash_bytes(data), sheet)
+        wanted = set(map(str, columns))
+        df = _frame_cache.get(digest)
+        if df is not None:
+            span.set(source="memory")
+            return df[[c for c in df.columns if str(c) in wanted]]
+        key = (digest, tuple(sorted(wanted)))
+        df = _frame_cache.get(key)
+        if df is not None:
+            span.set(source="memory")
+            return df
+        path = _spill_path(digest)
+        if INGEST_SPILL_ENABLED and os.path.exists(path):
+            try:
+                import pyarrow.parquet as pq
+                present = [c for c in pq.read_schema(path).names if c in wanted]
+                span.set(source="spill")
+                return pd.read_parquet(path, columns=present)
+            except Exception:
+                pass  # Unreadable spill: parse instead
+        try:
+            df = parse_file(file_name, data, sheet, columns=lambda c: str(c) in wanted)
+        except Exception as e:
+            raise ChatbotError(f"Failed to parse {file_name}: {str(e)}")
+        if COMPACT_DTYPES:
+            df = optimize_dtypes(df)
+        _frame_cache.put(key, df)
+        span.set(source="parse", rows=len(df))
+        return df
+
+
+def get_cached_frame(digest: str) -> Optional[pd.DataFrame]:
+    """Frame of an earlier upload from memory or the on-disk spill, or None if neither has it"""
+    df = _frame_cache.get(digest)
+    if df is not None:
+        return df
+    with tracing.span("ingest.reload", digest=digest) as span:
+        df = _load_spill(digest)
+        span.set(found=df is not None)
+    if df is not None:
+        _frame_cache.put(digest, df)
+    return df
+
+
+class FrameHandle:
+    """
+    Session-side reference to an uploaded dataset
+    Holds the content digest instead of the frame, so an idle session
+    costs no memory once the shared cache evicts its frame. Frames that
+    could not be spilled (or large-file samples) are pinned instead.
+    """
+
+    def __init__(self, digest: str, df: pd.DataFrame, pin: bool = False):
+        self.digest = digest
+        self.shape = df.shape
+        spilled = INGEST_SPILL_ENABLED and os.path.exists(_spill_path(digest))
+        self._pinned = df if pin or not spilled else None
+
+    @property
+    def is_pinned(self) -> bool:
+        return self._pinned is not None
+
+    def get(self) -> pd.DataFrame:
+        """Return the frame, reloading it from the spill if it was evicted"""
+        if self._pinned is not None:
+            return self._pinned
+        df = get_cached_frame(self.digest)
+        if df is None:
+            raise ChatbotError("The uploaded data is no longer available; please upload the file again")
+        return df
+
+
+def hash_stream(fileobj: IO[bytes], block_size: int = 8 * 1024 * 1024) -> str:
+    """Content hash of a file object read in blocks; rewinds it afterwards"""
+    digest = hashlib.blake2b(digest_size=16)
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def load_large_csv(fileobj: IO[bytes], digest: Optional[str] = None) -> Tuple[StreamingProfile, str]:
+    """
+    Profile a large CSV in one chunked pass instead of loading it
+    Only the statistics and a bounded reservoir sample are kept.
+    Args:
+        fileobj: Binary file object positioned anywhere
+        digest: Precomputed content hash, if the caller already has it
+    Returns:
+        tuple: (streaming profile, content digest)
+    """
+    with tracing.span("ingest.stream", file=getattr(fileobj, "name", None)) as span:
+        digest = digest or hash_stream(fileobj)
+        profile = _profile_cache.get(digest)
+        if profile is not None:
+            span.set(source="memory", rows=profile.rows, columns=len(profile.columns))
+            return profile, digest
+        fileobj.seek(0)
+        try:
+            profile = profile_csv(fileobj, chunksize=LARGE_FILE_CHUNK_ROWS, sample_rows=LARGE_FILE_SAMPLE_ROWS)
+        except Exception as e:
+            raise ChatbotError(f"Failed to stream CSV: {str(e)}")
+        if profile.rows < 1 or not profile.columns:
+            raise ChatbotError("Dataframe has no rows")
+        _profile_cache.put(digest, profile)
+        span.set(source="parse", rows=profile.rows, columns=len(profile.columns))
+        return profile, digest
+
+
+def clear_ingest_cache(remove_spill: bool = False) -> None:
+    """Drop cached frames, optionally deleting the on-disk spill files too"""
+    _frame_cache.clear()
+    _profile_cache.clear()
+    if remove_spill and os.path.isdir(INGEST_SPILL_DIR):
+        for name in os.listdir(INGEST_SPILL_DIR):
+            if name.endswith(".parquet"):
+                os.remove(os.path.join(INGEST_SPILL_DIR, name))
@@ -0,0 +1,234 @@
+import os
+import re
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from cache import LRUCache, frame_fingerprint
+
+# Column-name keywords for each logistics role, in priority order. Keywords of up to
+# SHORT_KEYWORD_CHARS characters must be a whole word of the name ("port" is not in "Transport")
+DIMENSION_KEYWORDS = {
+    "country": ("country", "nation"),
+    "region": ("region", "state", "province", "city", "destination", "port"),
+    "carrier": ("carrier", "shipper", "forwarder", "courier"),
+    "sku": ("sku", "product", "item", "material"),
+    "warehouse": ("warehouse", "depot", "hub", "location"),
+}
+MEASURE_KEYWORDS = {
+    "value": ("order value", "value", "revenue", "sales", "amount", "price"),
+    "cost": ("cost", "freight", "fee", "charge"),
+    "weight": ("weight", "kg", "tons", "tonnage"),
+    "quantity": ("quantity", "qty", "units", "volume", "pieces"),
+}
+DATE_KEYWORDS = ("date", "timestamp", "time", "day", "eta", "etd", "shipped", "delivered")
+SHORT_KEYWORD_CHARS = 4
+
+TOP_VALUES = int(os.getenv("KPI_TOP_VALUES", "50"))
+OTHER_LABEL = "Other"
+
+_cube_cache = LRUCache(
+    max_entries=int(os.getenv("KPI_CACHE_MAX_ENTRIES", "32")),
+    max_bytes=int(float(os.getenv("KPI_CACHE_MAX_MB", "64")) * 1024 * 1024),
+    sizeof=lambda cube: cube.nbytes,
+)
+
+
+def _words(column) -> List[str]:
+    """Lowercase words of a column name, splitting on punctuation and camelCase ("OrderQty" -> order, qty)"""
+    return [w.lower() for w in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", str(column))]
+
+
+def _match_keyword(column, keyword: str) -> bool:
+    if len(keyword) > SHORT_KEYWORD_CHARS:
+        return keyword in str(column).lower()
+    return any(word in (keyword, keyword + "s") for word in _words(column))
+
+
+def match_keywords(column, keywords) -> bool:
+    """Whether a column name contains any of the keywords (short ones as whole words)"""
+    return any(_match_keyword(column, keyword) for keyword in keywords)
+
+
+def _by_priority(columns, keywords) -> List:
+    """Columns matching the keywords, best first: keyword order, then exact names before partial matches"""
+    ranked = []
+    for keyword in keywords:
+        exact = [col for col in columns if str(col).strip().lower() == keyword]
+        partial = [col for col in columns if col not in exact and _match_keyword(col, keyword)]
+        ranked += [col for col in exact + partial if col not in ranked]
+    return ranked
+
+
+def role_candidates(columns) -> List:
+    """Columns whose names could fill a role; detect_roles never picks any other, so only these need loading"""
+    keywords = DATE_KEYWORDS + tuple(keyword for group in (DIMENSION_KEYWORDS, MEASURE_KEYWORDS)
+                                     for keywords in group.values() for keyword in keywords)
+    return [col for col in columns if match_keywords(col, keywords)]
+
+
+def _parse_dates(series: pd.Series) -> Optional[pd.Series]:
+    """Return the series as datetimes, or None if it does not hold dates"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return None
+    probe = series.dropna().head(100)
+    if probe.empty or pd.to_datetime(probe, errors="coerce").notna().mean() < 0.9:
+        return None
+    return pd.to_datetime(series, errors="coerce")
+
+
+def detect_roles(df: pd.DataFrame) -> Dict[str, Dict[str, str]]:
+    """
+    Map logistics roles to columns by name and dtype
+    Returns:
+        dict: {"date": column or None, "dimensions": {role: column}, "measures": {role: column}}
+    """
+    roles = {"date": None, "dimensions": {}, "measures": {}}
+    used = set()
+    for col in _by_priority(df.columns, DATE_KEYWORDS):
+        if _parse_dates(df[col]) is not None:
+            roles["date"] = col
+            used.add(col)
+            break
+    for role, keywords in MEASURE_KEYWORDS.items():
+        for col in _by_priority(df.columns, keywords):
+            if col not in used and pd.api.types.is_numeric_dtype(df[col]):
+                roles["measures"][role] = col
+                used.add(col)
+                break
+    for role, keywords in DIMENSION_KEYWORDS.items():
+        for col in _by_priority(df.columns, keywords):
+            if col not in used and not pd.api.types.is_numeric_dtype(df[col]):
+                roles["dimensions"][role] = col
+                used.add(col)
+                break
+    return roles
+
+
+def _top_values(series: pd.Series, top: int = TOP_VALUES) -> pd.Series:
+    """Keep the most frequent values and fold the long tail into "Other" as a categorical"""
+    counts = series.value_counts()
+    if len(counts) > top:
+        # Through object dtype: a categorical input has no "Other" category to assign
+        series = series.astype(object).where(series.isin(counts.index[:top]), OTHER_LABEL)
+    return series.astype("category")
+
+
+class KPICube:
+    """Precomputed logistics aggregates of one dataset"""
+
+    def __init__(self, rows: int, roles: Dict, tables: Dict[str, pd.DataFrame],
+                 date_range: Optional[tuple] = None, distinct: Optional[Dict[str, int]] = None):
+        self.rows = rows
+        self.roles = roles
+        self.tables = tables
+        self.date_range = date_range
+        self.distinct = distinct or {}
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(t.memory_usage(deep=True).sum() for t in self.tables.values()))
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.tables
+
+    def table(self, name: str) -> Optional[pd.DataFrame]:
+        return self.tables.get(name)
+
+    def to_markdown(self, max_rows: int = 12) -> str:
+        """Compact KPI overview for the chat prompt"""
+        if self.is_empty:
+            return ""
+        lines = ["### Precomputed KPIs"]
+        if self.date_range:
+            lines.append(f"- Period: {self.date_range[0].date()} to {self.date_range[1].date()}")
+        for role, count in self.distinct.items():
+            lines.append(f"- Distinct {role}: {count}")
+        for name, table in self.tables.items():
+            if name == "monthly_by":
+                continue
+            lines.append(f"\n#### {name.replace('_', ' ').title()}")
+            shown = table.head(max_rows)
+            lines.append(shown.to_markdown(index=not isinstance(shown.index, pd.RangeIndex)))
+            if len(table) > max_rows:
+                lines.append(f"... {len(table) - max_rows} more rows")
+        return "\n".join(lines)
+
+
+def build_kpi_cube(df: pd.DataFrame) -> KPICube:
+    """
+    Build the aggregates with vectorized group-bys, without touching df
+    Tables:
+        totals: sum/mean/p50/p95 of each measure plus row count
+        monthly: per-month sums and counts
+        by_<dimension>: per-value sums, counts, means and percentiles
+        monthly_by: month x dimension sums and counts (long format)
+    """
+    roles = detect_roles(df)
+    measures: List[str] = list(roles["measures"].values())
+    tables: Dict[str, pd.DataFrame] = {}
+    date_range = None
+    distinct = {}
+
+    if measures:
+        numbers = df[measures]
+        totals = pd.DataFrame({
+            "sum": numbers.sum(),
+            "mean": numbers.mean(),
+            "p50": numbers.quantile(0.5),
+            "p95": numbers.quantile(0.95),
+        })
+        totals["count"] = numbers.count()
+        tables["totals"] = totals
+
+    month = None
+    if roles["date"] is not None:
+        dates = _parse_dates(df[roles["date"]])
+        valid = dates.dropna()
+        if not valid.empty:
+            date_range = (valid.min(), valid.max())
+            month = dates.dt.to_period("M").astype(str).where(dates.notna()).rename("month")
+            grouped = df[measures].groupby(month) if measures else None
+            monthly = grouped.sum() if grouped is not None else pd.DataFrame(index=month.dropna().unique())
+            monthly["orders"] = month.value_counts()
+            tables["monthly"] = monthly.sort_index()
+
+    long_tables = []
+    for role, col in roles["dimensions"].items():
+        distinct[role] = int(df[col].nunique())
+        keys = _top_values(df[col]).rename(role)
+        grouped = df[measures].groupby(keys, observed=True) if measures else None
+        if grouped is not None:
+            by_dim = grouped.sum().add_prefix("sum_")
+            by_dim = by_dim.join(grouped.mean().add_prefix("mean_"))
+            by_dim = by_dim.join(grouped.quantile(0.95).add_prefix("p95_"))
+        else:
+            by_dim = pd.DataFrame(index=keys.cat.categories)
+        by_dim["orders"] = keys.value_counts()
+        sort_col = f"sum_{measures[0]}" if measures else "orders"
+        tables[f"by_{role}"] = by_dim.sort_values(sort_col, ascending=False)
+
+        if month is not None:
+            frame = df[measures].assign(orders=1) if measures else pd.DataFrame({"orders": 1}, index=df.index)
+            cross = frame.groupby([month, keys], observed=True).sum().reset_index()
+            cross = cross.rename(columns={role: "value"})
+            cross.insert(1, "dimension", role)
+            cross["value"] = cross["value"].astype(str)
+            long_tables.append(cross)
+
+    if long_tables:
+        monthly_by = pd.concat(long_tables, ignore_index=True)
+        monthly_by["dimension"] = monthly_by["dimension"].astype("category")
+        monthly_by["value"] = monthly_by["value"].astype("category")
+        tables["monthly_by"] = monthly_by
+
+    return KPICube(len(df), roles, tables, date_range=date_range, distinct=distinct)
+
+
+def get_kpi_cube(df: pd.DataFrame, fingerprint: Optional[str] = None) -> KPICube:
+    """Return the cached KPI cube of df, building it on first use"""
+    key = fingerprint or frame_fingerprint(df)
+    return _cube_cache.get_or_compute(key, lambda: build_kpi_cube(df))
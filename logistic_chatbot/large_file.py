@@ -0,0 +1,256 @@
+import math
+from typing import Dict, Iterable, List, Optional, Union, IO
+
+import numpy as np
+import pandas as pd
+
+from kpi_cube import DATE_KEYWORDS, match_keywords
+
+
+class HyperLogLog:
+    """Fixed-memory distinct-count estimator (2**precision one-byte registers)"""
+
+    def __init__(self, precision: int = 14):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        """Add 64-bit hashes (uint64 array)"""
+        if len(hashes) == 0:
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        # Position of the leftmost 1-bit in the remaining 64-p bits
+        nonzero = rest != 0
+        rho = np.full(len(hashes), 64 - self.p + 1, dtype=np.uint8)
+        leading = 63 - np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.int64)
+        rho[nonzero] = np.minimum(leading + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rho)
+
+    def add_series(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if values.empty:
+            return
+        if pd.api.types.is_numeric_dtype(values):
+            array = values.astype("float64").to_numpy()
+        else:
+            array = values.astype(str).to_numpy(dtype=object)
+        self.add_hashes(pd.util.hash_array(array))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return int(round(self.m * math.log(self.m / zeros)))
+        return int(round(raw))
+
+
+class _NumericAccumulator:
+    """Streaming count/mean/std/min/max using Chan's parallel merge of Welford moments"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        n_b = len(values)
+        if n_b == 0:
+            return
+        array = values.to_numpy(dtype=np.float64)
+        mean_b = float(array.mean())
+        m2_b = float(((array - mean_b) ** 2).sum())
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.n = n
+        self.min = min(self.min, float(array.min()))
+        self.max = max(self.max, float(array.max()))
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else float("nan")
+
+
+class StreamingProfile:
+    """
+    Statistics of a dataset gathered one chunk at a time
+    Keeps only fixed-size state per column plus a bounded reservoir sample.
+    """
+
+    def __init__(self, sample_rows: int = 1000, date_columns: Optional[Iterable[str]] = None,
+                 seed: int = 0):
+        self.sample_rows = sample_rows
+        self.rows = 0
+        self.columns: List[str] = []
+        self.kinds: Dict[str, str] = {}
+        self.missing: Dict[str, int] = {}
+        self.invalid: Dict[str, int] = {}  # Cells of numeric/date columns that did not parse
+        self.numeric: Dict[str, _NumericAccumulator] = {}
+        self.distinct: Dict[str, HyperLogLog] = {}
+        self.date_min: Dict[str, pd.Timestamp] = {}
+        self.date_max: Dict[str, pd.Timestamp] = {}
+        self.sample = pd.DataFrame()
+        self._date_columns = set(date_columns or [])
+        self._rng = np.random.default_rng(seed)
+
+    def _init_columns(self, chunk: pd.DataFrame) -> None:
+        self.columns = list(chunk.columns)
+        for col in self.columns:
+            series = chunk[col]
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                kind = "numeric"
+            elif pd.api.types.is_datetime64_any_dtype(series) or col in self._date_columns \
+                    or self._looks_like_dates(col, series):
+                kind = "date"
+            else:
+                kind = "text"
+            self.kinds[col] = kind
+            self.missing[col] = 0
+            self.invalid[col] = 0
+            if kind == "numeric":
+                self.numeric[col] = _NumericAccumulator()
+            elif kind == "text":
+                self.distinct[col] = HyperLogLog()
+
+    @staticmethod
+    def _looks_like_dates(col: str, series: pd.Series) -> bool:
+        if not match_keywords(col, DATE_KEYWORDS):
+            return False
+        values = series.dropna().head(100)
+        if values.empty:
+            return False
+        parsed = pd.to_datetime(values, errors="coerce")
+        return parsed.notna().mean() >= 0.9
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Fold one chunk of rows into the running statistics"""
+        if not self.columns:
+            self._init_columns(chunk)
+        for col in self.columns:
+            series = chunk[col] if col in chunk.columns else pd.Series(index=chunk.index, dtype=object)
+            kind = self.kinds[col]
+            missing = series.isna()
+            self.missing[col] += int(missing.sum())
+            if kind == "numeric":
+                series = pd.to_numeric(series, errors="coerce")
+                self.invalid[col] += int((series.isna() & ~missing).sum())
+                self.numeric[col].update(series)
+            elif kind == "date":
+                series = pd.to_datetime(series, errors="coerce")
+                self.invalid[col] += int((series.isna() & ~missing).sum())
+                valid = series.dropna()
+                if not valid.empty:
+                    low, high = valid.min(), valid.max()
+                    self.date_min[col] = min(self.date_min.get(col, low), low)
+                    self.date_max[col] = max(self.date_max.get(col, high), high)
+            else:
+                self.distinct[col].add_series(series)
+        self._update_reservoir(chunk)
+        self.rows += len(chunk)
+
+    def _update_reservoir(self, chunk: pd.DataFrame) -> None:
+        """Vectorized Algorithm R: every row so far has equal chance to be sampled"""
+        k = self.sample_rows
+        chunk = chunk.reset_index(drop=True)
+        fill = max(0, min(k - len(self.sample), len(chunk)))
+        if fill:
+            head = chunk.iloc[:fill]
+            self.sample = head.copy() if self.sample.empty else pd.concat([self.sample, head], ignore_index=True)
+        if fill == len(chunk):
+            return
+        positions = np.arange(self.rows + fill, self.rows + len(chunk))
+        slots = (self._rng.random(len(positions)) * (positions + 1)).astype(np.int64)
+        accepted = slots < k
+        if not accepted.any():
+            return
+        rows = positions[accepted] - self.rows
+        slots = slots[accepted]
+        # When a slot is hit several times the latest row wins, as in the sequential algorithm
+        _, last = np.unique(slots[::-1], return_index=True)
+        keep = len(slots) - 1 - last
+        replacement = chunk.iloc[rows[keep]].copy()
+        replacement.index = slots[keep]
+        self.sample = pd.concat([self.sample.drop(index=slots[keep]), replacement]).sort_index()
+
+    @property
+    def total_missing(self) -> int:
+        return sum(self.missing.values())
+
+    def summary_markdown(self, sample_size: int = 3) -> str:
+        """Markdown summary in the same layout as utils.summarize_data"""
+        summary = [
+            f"## Data Summary ({self.rows} rows × {len(self.columns)} columns, streamed)",
+            f"**Columns:** {', '.join(f'`{col}`' for col in self.columns)}",
+            f"**Missing values:** {self.total_missing} total",
+        ]
+        invalid = {col: n for col, n in self.invalid.items() if n}
+        if invalid:
+            summary.append("**Unparseable values** (left out of the statistics): "
+                           + ", ".join(f"`{col}` {n}" for col, n in invalid.items()))
+
+        numeric_cols = [c for c in self.columns if self.kinds[c] == "numeric"]
+        if numeric_cols:
+            summary.append("\n### Numeric Columns")
+            stats = pd.DataFrame(
+                {
+                    "mean": [self.numeric[c].mean if self.numeric[c].n else float("nan") for c in numeric_cols],
+                    "min": [self.numeric[c].min if self.numeric[c].n else float("nan") for c in numeric_cols],
+                    "max": [self.numeric[c].max if self.numeric[c].n else float("nan") for c in numeric_cols],
+                    "std": [self.numeric[c].std for c in numeric_cols],
+                },
+                index=numeric_cols,
+            )
+            stats["range"] = stats["max"] - stats["min"]
+            summary.append(stats[["mean", "min", "max", "range", "std"]].to_markdown())
+
+        text_cols = [c for c in self.columns if self.kinds[c] == "text"]
+        if text_cols:
+            summary.append("\n### Text Columns")
+            for col in text_cols:
+                sample_values = self.sample[col].dropna().head(sample_size).tolist() if col in self.sample else []
+                summary.append(
+                    f"- `{col}`: ~{self.distinct[col].estimate()} unique values\n"
+                    f"  Sample: {', '.join(str(v) for v in sample_values)}"
+                )
+
+        date_cols = [c for c in self.columns if self.kinds[c] == "date"]
+        if date_cols:
+            summary.append("\n### Date Columns")
+            for col in date_cols:
+                if col in self.date_min:
+                    summary.append(f"- `{col}`: {self.date_min[col]} to {self.date_max[col]}")
+                else:
+                    summary.append(f"- `{col}`: no valid dates")
+
+        return "\n".join(summary)
+
+
+def profile_csv(source: Union[str, IO], chunksize: int = 100_000, sample_rows: int = 1000,
+                date_columns: Optional[Iterable[str]] = None, seed: int = 0) -> StreamingProfile:
+    """
+    Profile a CSV in one streaming pass without loading it whole
+    Args:
+        source: Path or file-like object
+        chunksize: Rows parsed per chunk
+        sample_rows: Size of the reservoir sample kept for chat
+        date_columns: Columns to treat as dates in addition to detected ones
+        seed: Seed of the reservoir sampler, for reproducible samples
+    Returns:
+        StreamingProfile: Accumulated statistics and the bounded sample
+    """
+    profile = StreamingProfile(sample_rows=sample_rows, date_columns=date_columns, seed=seed)
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        profile.update(chunk)
+    return profile
@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterator, Optional
+
+import httpx
+import groq
+from groq import Groq
+from dotenv import load_dotenv
+
+import tracing
+from context_builder import count_tokens
+from scheduler import get_scheduler
+
+load_dotenv()
+
+# ---- Configuration ----
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "20"))
+# Answer tokens charged to the token bucket up front; settled with the real usage afterwards
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "800"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_client: Optional[Groq] = None
+_client_lock = threading.Lock()
+# Identical requests already on their way upstream, joined instead of repeated
+_pending_calls: Dict[str, Future] = {}
+_pending_streams: Dict[str, "_SharedStream"] = {}
+_pending_lock = threading.Lock()
+
+
+class MissingAPIKeyError(RuntimeError):
+    """Raised when GROQ_API_KEY is not configured"""
+    pass
+
+
+def get_client() -> Groq:
+    """
+    Return the process-wide Groq client
+    The underlying httpx client keeps connections alive, so TLS and
+    connection setup are paid once instead of on every message.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            api_key = os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise MissingAPIKeyError("GROQ_API_KEY not found in environment variables")
+            http_client = httpx.Client(
+                timeout=httpx.Timeout(LLM_TIMEOUT_S, connect=LLM_CONNECT_TIMEOUT_S),
+                limits=httpx.Limits(
+                    max_connections=LLM_POOL_SIZE,
+                    max_keepalive_connections=LLM_POOL_SIZE,
+                    keepalive_expiry=60,
+                ),
+            )
+            _client = Groq(
+                api_key=api_key,
+                base_url=GROQ_BASE_URL,
+                http_client=http_client,
+                max_retries=0,  # Retries are handled below with jittered backoff
+            )
+    return _client
+
+
+def reset_client() -> None:
+    """Close the shared client so the next call builds a fresh one"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (groq.APITimeoutError, groq.APIConnectionError)):
+        return True
+    if isinstance(error, groq.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, if it said so"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than a server Retry-After"""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * (2 ** attempt)))
+    server_hint = _retry_after(error) if error is not None else None
+    if server_hint is not None:
+        delay = max(delay, min(server_hint, LLM_BACKOFF_MAX_S))
+    return delay
+
+
+def _create_with_retries(tokens: int, **kwargs):
+    """
+    Send the request once the scheduler lets it through, retrying failures
+    Every attempt queues again, so a retry after a 429 also waits out the
+    pause it caused. On success the caller holds a scheduler slot and must
+    release it; on failure it has been released.
+    """
+    client = get_client()
+    scheduler = get_scheduler()
+    attempt = 0
+    waited = 0.0
+    while True:
+        waited += scheduler.acquire(tokens)
+        tracing.annotate(queue_wait_s=waited)
+        try:
+            raw = client.chat.completions.with_raw_response.create(**kwargs)
+            scheduler.on_success(raw.headers)  # Rate-limit headers keep the buckets in step with the server
+            return raw.parse()
+        except Exception as e:
+            scheduler.release(tokens)
+            if attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            if isinstance(e, groq.APIStatusError) and e.status_code == 429:
+                # Hold back every caller, this one included, until the pause ends
+                scheduler.on_rate_limited(delay, e.response.headers)
+            else:
+                time.sleep(delay)
+            attempt += 1
+            tracing.annotate(retries=attempt)
+
+
+def _request_key(kwargs: Dict) -> str:
+    return hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _estimate_tokens(kwargs: Dict) -> int:
+    prompt = sum(count_tokens(m.get("content")) for m in kwargs.get("messages", []))
+    return prompt + min(kwargs.get("max_tokens") or LLM_EXPECTED_COMPLETION_TOKENS, LLM_EXPECTED_COMPLETION_TOKENS)
+
+
+def _used_tokens(usage) -> Optional[int]:
+    total = getattr(usage, "total_tokens", None)
+    return int(total) if total is not None else None
+
+
+def create_chat_completion(**kwargs):
+    """
+    Call chat.completions.create through the shared client
+    Waits its turn in the process-wide scheduler, holds one upstream slot
+    for the duration of the call and retries 429/5xx/connection errors
+    with jittered exponential backoff. Callers sending an identical
+    request while one is in flight share its response.
+    """
+    key = _request_key(kwargs)
+    with _pending_lock:
+        future = _pending_calls.get(key)
+        leader = future is None
+        if leader:
+            future = _pending_calls[key] = Future()
+    if not leader:
+        tracing.annotate(deduplicated=True)
+        return future.result()
+
+    try:
+        estimate = _estimate_tokens(kwargs)
+        response = _create_with_retries(estimate, **kwargs)
+        get_scheduler().release(estimate, _used_tokens(getattr(response, "usage", None)))
+        future.set_result(response)
+        return response
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _pending_lock:
+            _pending_calls.pop(key, None)
+
+
+class _SharedStream:
+    """
+    One upstream stream read by every caller that asked for it
+    Chunks are buffered; whichever subscriber needs a chunk that has not
+    arrived yet reads it from upstream, so no subscriber depends on
+    another one consuming. The stream closes when it ends or when its
+    last subscriber leaves.
+    """
+
+    def __init__(self, key: str, kwargs: Dict):
+        self.key = key
+        self.kwargs = kwargs
+        self.subscribers = 0
+        self.chunks = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._stream = None
+        self._estimate = 0
+        self._used = None
+        self._holds_slot = False
+
+    def read(self, index: int):
+        """Chunk at index, or None after the last one; re-raises an upstream error"""
+        with self._lock:
+            while len(self.chunks) <= index and not self.done:
+                try:
+                    if self._stream is None:
+                        self._estimate = _estimate_tokens(self.kwargs)
+                        self._stream = _create_with_retries(self._estimate, stream=True, **self.kwargs)
+                        self._holds_slot = True
+                    chunk = next(self._stream)
+                except StopIteration:
+                    self._finish()
+                except BaseException as e:
+                    self.error = e
+                    self._finish()
+                else:
+                    self._used = _used_tokens(getattr(getattr(chunk, "x_groq", None), "usage", None)) or self._used
+                    self.chunks.append(chunk)
+            if index < len(self.chunks):
+                return self.chunks[index]
+            if self.error is not None:
+                raise self.error
+            return None
+
+    def _finish(self) -> None:
+        self.done = True
+        with _pending_lock:
+            if _pending_streams.get(self.key) is self:
+                del _pending_streams[self.key]
+        if self._stream is not None:
+            self._stream.close()
+        if self._holds_slot:
+            self._holds_slot = False
+            get_scheduler().release(self._estimate, self._used)
+
+    def leave(self) -> None:
+        with _pending_lock:
+            self.subscribers -= 1
+            abandoned = self.subscribers == 0
+            if abandoned and _pending_streams.get(self.key) is self:
+                del _pending_streams[self.key]  # No one may join a stream that is being closed
+        if abandoned:
+            with self._lock:
+                if not self.done:
+                    self._finish()
+
+
+def stream_chat_completion(**kwargs) -> Iterator:
+    """
+    Streaming variant of create_chat_completion yielding raw chunks
+    The upstream slot is held until the stream is exhausted or abandoned.
+    Only opening the stream is retried; a stream that fails midway raises.
+    An identical stream already in flight is joined from its first chunk.
+    """
+    key = _request_key(dict(kwargs, stream=True))
+    with _pending_lock:
+        shared = _pending_streams.get(key)
+        if shared is None:
+            shared = _pending_streams[key] = _SharedStream(key, kwargs)
+        else:
+            tracing.annotate(deduplicated=True)
+        shared.subscribers += 1
+    try:
+        index = 0
+        while True:
+            chunk = shared.read(index)
+            if chunk is None:
+                return
+            yield chunk
+            index += 1
+    finally:
+        shared.leave()
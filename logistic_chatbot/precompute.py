@@ -0,0 +1,154 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+import tracing
+from cache import LRUCache, frame_fingerprint
+from kpi_cube import get_kpi_cube
+from retrieval import get_row_index
+from utils import get_data_schema, summarize_data
+
+PRECOMPUTE_WORKERS = int(os.getenv("PRECOMPUTE_WORKERS", "4"))
+PREVIEW_ROWS = 100
+SAMPLE_ROWS = 10
+
+# Task name -> human-readable label shown while it runs
+TASKS = {
+    "fingerprint": "Fingerprinting data",
+    "preview": "Preparing preview",
+    "describe": "Computing statistics",
+    "sample": "Drawing sample",
+    "summary": "Summarizing columns",
+    "kpi": "Aggregating KPIs",
+    "schema": "Profiling schema",
+    "index": "Indexing rows",
+}
+# Work the chat path needs before it can build a data prompt
+CHAT_TASKS = ("fingerprint", "summary", "kpi", "schema", "index")
+
+_executor = ThreadPoolExecutor(max_workers=PRECOMPUTE_WORKERS, thread_name_prefix="precompute")
+# Jobs by upload digest; results are small (describe/sample/preview frames)
+_jobs = LRUCache(max_entries=int(os.getenv("PRECOMPUTE_MAX_JOBS", "32")), sizeof=lambda job: 0)
+_jobs_lock = threading.Lock()
+
+
+class PrecomputeJob:
+    """
+    Background analysis of one uploaded dataset
+    The fingerprint runs first; every other task is then submitted in
+    parallel. Results of the summary, KPI, schema and index tasks land in
+    the shared caches, so the chat path picks them up by fingerprint.
+    """
+
+    def __init__(self, digest: str):
+        self.digest = digest
+        self.futures: Dict[str, Future] = {}
+        self._submitted = threading.Event()
+
+    def _start(self, df: pd.DataFrame) -> None:
+        # Nothing but the running tasks may reference df, or an evicted frame would stay alive
+        self.futures["fingerprint"] = _executor.submit(self._fingerprint_then_fan_out, df)
+
+    def _fingerprint_then_fan_out(self, df: pd.DataFrame) -> str:
+        fp = None
+        try:
+            fp = self._task("fingerprint", lambda: frame_fingerprint(df))
+            return fp
+        finally:
+            # On failure each task recomputes the fingerprint itself and reports its own error
+            tasks: Dict[str, Callable[[], Any]] = {
+                "preview": lambda: df.head(PREVIEW_ROWS).copy(),  # A plain head() is a view that pins df
+                "describe": lambda: df.describe(include="number"),  # Datetime stats would mix types in one column
+                "sample": lambda: df.sample(min(SAMPLE_ROWS, len(df)), random_state=0),
+                "summary": lambda: summarize_data(df, fingerprint=fp),
+                "kpi": lambda: get_kpi_cube(df, fingerprint=fp),
+                "schema": lambda: get_data_schema(df, fp),
+                "index": lambda: get_row_index(df, fp),
+            }
+            try:
+                for name, fn in tasks.items():
+                    self.futures[name] = _executor.submit(self._task, name, fn)
+            except RuntimeError:
+                pass  # Executor shut down at interpreter exit
+            self._submitted.set()
+
+    def _task(self, name: str, fn: Callable[[], Any]) -> Any:
+        with tracing.span("precompute", task=name, digest=self.digest):
+            return fn()
+
+    def progress(self) -> Tuple[int, int]:
+        """(finished tasks, total tasks)"""
+        return sum(1 for f in list(self.futures.values()) if f.done()), len(TASKS)
+
+    @property
+    def done(self) -> bool:
+        finished, total = self.progress()
+        return finished == total
+
+    def current_label(self) -> Optional[str]:
+        """Label of the first task still running, for progress text"""
+        for name, label in TASKS.items():
+            future = self.futures.get(name)
+            if future is None or not future.done():
+                return label
+        return None
+
+    def ready(self, name: str) -> bool:
+        """True when the task finished successfully"""
+        future = self.futures.get(name)
+        return future is not None and future.done() and future.exception() is None
+
+    def error(self, name: str) -> Optional[BaseException]:
+        """Exception raised by a finished task, if any"""
+        future = self.futures.get(name)
+        return future.exception() if future is not None and future.done() else None
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        """Result of one task, waiting up to timeout; re-raises the task's error"""
+        if name != "fingerprint" and not self._submitted.wait(timeout):
+            raise TimeoutError(f"Precompute task {name} not started yet")
+        return self.futures[name].result(timeout)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Result of a finished task without waiting, or default"""
+        return self.futures[name].result() if self.ready(name) else default
+
+    def wait(self, names: Iterable[str] = CHAT_TASKS, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the named tasks finish (successfully or not)
+        Lets a question that arrives mid-analysis wait for the remaining
+        work instead of repeating it.
+        Returns:
+            bool: True if all of them finished within timeout
+        """
+        names = list(names)
+        if any(name != "fingerprint" for name in names) and not self._submitted.wait(timeout):
+            return False
+        _, pending = wait([self.futures[name] for name in names if name in self.futures], timeout=timeout)
+        return not pending
+
+
+def start_precompute(digest: str, df: pd.DataFrame) -> PrecomputeJob:
+    """
+    Start background analysis of an uploaded dataset (once per digest)
+    Args:
+        digest: Content hash of the upload
+        df: Parsed dataset
+    Returns:
+        PrecomputeJob: The new or already running job
+    """
+    with _jobs_lock:
+        job = _jobs.get(digest)
+        if job is None:
+            job = PrecomputeJob(digest)
+            job._start(df)
+            _jobs.put(digest, job)
+    return job
+
+
+def get_precompute(digest: Optional[str]) -> Optional[PrecomputeJob]:
+    """Job started for digest, if it is still tracked"""
+    return _jobs.get(digest) if digest else None
@@ -0,0 +1,163 @@
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from large_file import HyperLogLog
+
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "8192"))  # Rows behind quantiles, samples and top values
+# Factorizing is faster than hashing, so sketches only take over where its
+# table of every distinct value would cost too much memory
+PROFILE_EXACT_ROWS = int(os.getenv("PROFILE_EXACT_ROWS", "5000000"))
+PROFILE_TOP_K = 3
+PROFILE_TOP_MIN_SHARE = 0.01  # Top values are listed only when the most frequent reaches this share
+PROFILE_QUANTILES = (0.5,)
+
+
+def sample_positions(rows: int, size: int = PROFILE_SAMPLE_ROWS, seed: int = 0) -> np.ndarray:
+    """Sorted row positions of a seeded uniform sample, identical for identical sizes"""
+    if rows <= size:
+        return np.arange(rows)
+    return np.sort(np.random.default_rng(seed).choice(rows, size=size, replace=False))
+
+
+def _hash_values(values: pd.Series) -> np.ndarray:
+    try:
+        return pd.util.hash_pandas_object(values, index=False).to_numpy()
+    except TypeError:
+        # Mixed object columns (e.g. numbers among strings) hash via their text
+        return pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy()
+
+
+class FrameProfile:
+    """
+    Column statistics of an in-memory frame from one pass per column
+    Numeric columns get exact moments and sample-based quantiles; text
+    columns get distinct counts and top values, exact from category or
+    factorized codes, or from HyperLogLog and the sample on very large frames. Samples come from seeded
+    row positions, so identical data always gives an identical profile.
+    """
+
+    def __init__(self, df: pd.DataFrame, seed: int = 0):
+        self.rows = len(df)
+        self.columns = list(df.columns)
+        self.missing = 0
+        self.numeric: Dict[str, Dict[str, float]] = {}
+        self.text: Dict[str, Dict] = {}
+        self.dates: Dict[str, Tuple] = {}
+        self._positions = sample_positions(self.rows, seed=seed)
+
+        for col in self.columns:
+            series = df[col]
+            self.missing += int(series.isna().sum())
+            if pd.api.types.is_bool_dtype(series):
+                continue
+            if pd.api.types.is_numeric_dtype(series):
+                self.numeric[col] = self._numeric(series)
+            elif isinstance(series.dtype, pd.CategoricalDtype):
+                self.text[col] = self._categorical(series)
+            elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+                self.text[col] = self._text(series)
+            elif pd.api.types.is_datetime64_any_dtype(series):
+                self.dates[col] = (series.min(), series.max())
+
+    def _numeric(self, series: pd.Series) -> Dict[str, float]:
+        array = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = array[~np.isnan(array)]
+        if len(valid) == 0:
+            return {"mean": np.nan, "min": np.nan, "max": np.nan, "std": np.nan,
+                    **{f"p{int(q * 100)}": np.nan for q in PROFILE_QUANTILES}}
+        sampled = array[self._positions]
+        sampled = sampled[~np.isnan(sampled)]
+        quantiles = np.quantile(sampled if len(sampled) else valid, PROFILE_QUANTILES)
+        return {
+            "mean": float(valid.mean()),
+            "min": float(valid.min()),
+            "max": float(valid.max()),
+            "std": float(valid.std(ddof=1)) if len(valid) > 1 else np.nan,
+            **{f"p{int(q * 100)}": float(v) for q, v in zip(PROFILE_QUANTILES, quantiles)},
+        }
+
+    def _counted(self, series: pd.Series, codes: np.ndarray, labels) -> Dict:
+        """Exact distinct count and top values from integer codes (-1 = missing)"""
+        counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+        order = np.argsort(-counts, kind="stable")[:PROFILE_TOP_K]
+        return {
+            "distinct": int(np.count_nonzero(counts)),
+            "approximate": False,
+            "top": [(labels[i], int(counts[i])) for i in order if counts[i] > 0],
+            "sample": self._sample_values(series),
+        }
+
+    def _categorical(self, series: pd.Series) -> Dict:
+        # Compacted frames already carry codes, so nothing needs hashing
+        return self._counted(series, series.cat.codes.to_numpy(), series.cat.categories)
+
+    def _text(self, series: pd.Series) -> Dict:
+        if self.rows <= PROFILE_EXACT_ROWS:
+            codes, uniques = pd.factorize(series)
+            return self._counted(series, codes, uniques)
+        # Fixed memory beyond PROFILE_EXACT_ROWS: HyperLogLog for distinct values,
+        # heavy hitters from the sample with their counts scaled up
+        values = series.dropna()
+        hll = HyperLogLog()
+        hll.add_hashes(_hash_values(values))
+        sampled = series.iloc[self._positions].dropna()
+        scale = len(values) / max(1, len(sampled))
+        top = sampled.astype(object).value_counts().head(PROFILE_TOP_K)
+        return {"distinct": hll.estimate(), "approximate": True,
+                "top": [(value, int(round(count * scale))) for value, count in top.items()],
+                "sample": self._sample_values(series)}
+
+    def _sample_values(self, series: pd.Series, limit: int = 10) -> List:
+        """Distinct values in seeded-sample order"""
+        sampled = series.iloc[self._positions].dropna().astype(object)
+        return list(dict.fromkeys(sampled.head(limit * 10)))[:limit]
+
+    def summary_markdown(self, sample_size: int = 3) -> str:
+        """Markdown summary in the layout of utils.summarize_data"""
+        summary = [
+            f"## Data Summary ({self.rows} rows × {len(self.columns)} columns)",
+            f"**Columns:** {', '.join(f'`{col}`' for col in self.columns)}",
+            f"**Missing values:** {self.missing} total",
+        ]
+
+        if self.numeric:
+            summary.append("\n### Numeric Columns")
+            stats = pd.DataFrame.from_dict(self.numeric, orient="index")
+            stats["range"] = stats["max"] - stats["min"]
+            quantiles = [f"p{int(q * 100)}" for q in PROFILE_QUANTILES]
+            summary.append(stats[["mean", "min", "max", "range", "std"] + quantiles].to_markdown())
+
+        if self.text:
+            summary.append("\n### Text Columns")
+            for col, info in self.text.items():
+                mark = "~" if info["approximate"] else ""
+                total = max(1, self.rows)
+                top = [(value, count / total) for value, count in info["top"]]
+                lines = [f"- `{col}`: {mark}{info['distinct']} unique values"]
+                # Near-unique columns (IDs, SKUs) have no values worth naming
+                if top and top[0][1] >= PROFILE_TOP_MIN_SHARE:
+                    lines.append("  Top: " + ", ".join(f"{value} ({mark}{share:.0%})" for value, share in top))
+                lines.append(f"  Sample: {', '.join(str(v) for v in info['sample'][:sample_size])}")
+                summary.append("\n".join(lines))
+
+        if self.dates:
+            summary.append("\n### Date Columns")
+            for col, (low, high) in self.dates.items():
+                summary.append(f"- `{col}`: {low} to {high}")
+
+        return "\n".join(summary)
+
+
+def profile_frame(df: pd.DataFrame, seed: int = 0) -> FrameProfile:
+    """
+    Profile every column of df
+    Args:
+        df: Dataset to profile
+        seed: Seed of the row sample behind quantiles, top values and samples
+    Returns:
+        FrameProfile: Per-column statistics
+    """
+    return FrameProfile(df, seed=seed)
@@ -0,0 +1,269 @@
+import re
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+MAX_RESULT_ROWS = 100
+DEFAULT_RESULT_ROWS = 20
+
+FILTER_OPS = {"==", "!=", ">", ">=", "<", "<=", "in", "not_in", "contains", "between", "is_null", "not_null"}
+AGG_FUNCS = {"sum", "mean", "median", "min", "max", "count", "nunique", "std"}
+TIME_BUCKETS = {"D": "D", "W": "W", "M": "M", "Q": "Q", "Y": "Y"}
+
+QUERY_FORMAT = """{
+  "filters": [{"column": "<name>", "op": "==|!=|>|>=|<|<=|in|not_in|contains|between|is_null|not_null", "value": <value or list>}],
+  "group_by": ["<name>" or {"column": "<date column>", "freq": "D|W|M|Q|Y"}],
+  "aggregations": [{"column": "<name or *>", "func": "sum|mean|median|min|max|count|nunique|std", "alias": "<optional>"}],
+  "sort": [{"column": "<result column>", "ascending": false}],
+  "limit": 20
+}"""
+
+
+class QueryError(Exception):
+    """Raised when a structured query is malformed or cannot run on the data"""
+    pass
+
+
+def describe_schema(df: pd.DataFrame, max_values: int = 5, max_cardinality: int = 50) -> str:
+    """
+    Compact schema of a dataframe for the query planner
+    Lists every column with its dtype, plus the values of low-cardinality
+    text columns so the model can write exact filters.
+    """
+    lines = [f"Rows: {len(df)}"]
+    for col in df.columns:
+        series = df[col]
+        line = f"- `{col}` ({series.dtype})"
+        is_text = not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series))
+        if is_text:
+            counts = series.value_counts()
+            if len(counts) <= max_cardinality:
+                values = ", ".join(repr(v) for v in counts.index[:max_values])
+                line += f": {len(counts)} values, e.g. {values}"
+            else:
+                line += f": {len(counts)} distinct values"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def build_planner_prompt(question: str, schema: str) -> str:
+    """Prompt asking the model to translate a question into a structured query"""
+    return f"""Translate the question into a JSON query over a table with this schema:
+{schema}
+
+Query format (omit keys you do not need):
+{QUERY_FORMAT}
+
+Use only the column names listed above. Aggregation results are named "<func>_<column>"
+unless an alias is given; sort by those names. Reply with the JSON object only.
+If the question cannot be answered by such a query, reply with {{"query": null}}.
+
+Question: {question}"""
+
+
+def parse_query(text: str) -> Optional[Dict]:
+    """Extract the JSON query from a model reply; None when the model declined"""
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        raise QueryError("No JSON object in planner output")
+    try:
+        spec = json.loads(match.group(0))
+    except ValueError as e:
+        raise QueryError(f"Invalid query JSON: {str(e)}")
+    if not isinstance(spec, dict):
+        raise QueryError("Query must be a JSON object")
+    if "query" in spec:
+        if spec["query"] is None:
+            return None
+        if isinstance(spec["query"], dict):
+            spec = spec["query"]
+    return _check_shape(spec)
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("true", "asc", "ascending", "1"):
+        return True
+    if text in ("false", "desc", "descending", "0"):
+        return False
+    raise QueryError(f"ascending must be true or false, got {value!r}")
+
+
+def _check_shape(spec: Dict) -> Dict:
+    """Reject fields of the wrong JSON type; a bare group_by string is one key"""
+    for field in ("filters", "aggregations", "sort"):
+        value = spec.get(field)
+        if value is not None and not (isinstance(value, list) and all(isinstance(v, dict) for v in value)):
+            raise QueryError(f"{field} must be a list of objects, got {value!r}")
+    group_by = spec.get("group_by")
+    if isinstance(group_by, str):
+        spec = {**spec, "group_by": [group_by]}
+    elif group_by is not None and not (isinstance(group_by, list)
+                                       and all(isinstance(k, (str, dict)) for k in group_by)):
+        raise QueryError(f"group_by must be a column name or a list of them, got {group_by!r}")
+    # Column names are looked up in df.columns, which needs them hashable
+    entries = [(field, entry) for field in ("filters", "aggregations", "sort", "group_by")
+               for entry in spec.get(field) or [] if isinstance(entry, dict)]
+    for field, entry in entries:
+        if "column" in entry and not isinstance(entry["column"], str):
+            raise QueryError(f"{field} column must be a column name, got {entry['column']!r}")
+    if spec.get("sort"):
+        spec = {**spec, "sort": [{**s, "ascending": _parse_bool(s.get("ascending", True))} for s in spec["sort"]]}
+    return spec
+
+
+def _check_column(df: pd.DataFrame, column: Any) -> str:
+    if column not in df.columns:
+        raise QueryError(f"Unknown column: {column}")
+    return column
+
+
+def _coerce(series: pd.Series, value: Any) -> Any:
+    """Convert a JSON literal to the column's type so comparisons are vectorized"""
+    if isinstance(value, list):
+        return [_coerce(series, v) for v in value]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    if pd.api.types.is_numeric_dtype(series) and isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            raise QueryError(f"Column `{series.name}` is numeric, got {value!r}")
+    return value
+
+
+def _filter_mask(series: pd.Series, op: str, value: Any) -> np.ndarray:
+    if op == "is_null":
+        return series.isna().to_numpy()
+    if op == "not_null":
+        return series.notna().to_numpy()
+    value = _coerce(series, value)
+    if op == "==":
+        mask = series == value
+    elif op == "!=":
+        mask = series != value
+    elif op == ">":
+        mask = series > value
+    elif op == ">=":
+        mask = series >= value
+    elif op == "<":
+        mask = series < value
+    elif op == "<=":
+        mask = series <= value
+    elif op in ("in", "not_in"):
+        values = value if isinstance(value, list) else [value]
+        mask = series.isin(values)
+        if op == "not_in":
+            mask = ~mask
+    elif op == "contains":
+        mask = series.astype(str).str.contains(str(value), case=False, regex=False, na=False)
+    elif op == "between":
+        if not isinstance(value, list) or len(value) != 2:
+            raise QueryError("between expects [low, high]")
+        mask = series.between(value[0], value[1])
+    else:
+        raise QueryError(f"Unsupported filter op: {op}")
+    return mask.fillna(False).to_numpy(dtype=bool)
+
+
+def _group_key(df: pd.DataFrame, key: Any) -> pd.Series:
+    if isinstance(key, str):
+        return df[_check_column(df, key)]
+    if isinstance(key, dict):
+        column = _check_column(df, key.get("column"))
+        freq = TIME_BUCKETS.get(str(key.get("freq", "")).upper())
+        if freq is None:
+            raise QueryError(f"Unsupported time bucket: {key.get('freq')}")
+        dates = df[column]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors="coerce")
+        return dates.dt.to_period(freq).astype(str).rename(column)
+    raise QueryError(f"Invalid group_by entry: {key!r}")
+
+
+def execute_query(df: pd.DataFrame, spec: Dict) -> pd.DataFrame:
+    """
+    Run a filter / group-by / aggregate / sort / top-k query with vectorized pandas
+    Args:
+        df: Full dataset
+        spec: Query in the QUERY_FORMAT layout
+    Returns:
+        pd.DataFrame: Result table of at most MAX_RESULT_ROWS rows
+    """
+    filters = spec.get("filters") or []
+    group_by = spec.get("group_by") or []
+    aggregations = spec.get("aggregations") or []
+    sort = spec.get("sort") or []
+    try:
+        limit = min(int(DEFAULT_RESULT_ROWS if spec.get("limit") is None else spec["limit"]), MAX_RESULT_ROWS)
+    except (TypeError, ValueError):
+        raise QueryError("limit must be an integer")
+    if limit <= 0:
+        raise QueryError(f"limit must be positive, got {spec.get('limit')!r}")
+
+    mask = np.ones(len(df), dtype=bool)
+    for f in filters:
+        column = _check_column(df, f.get("column"))
+        op = f.get("op", "==")
+        if op not in FILTER_OPS:
+            raise QueryError(f"Unsupported filter op: {op}")
+        try:
+            mask &= _filter_mask(df[column], op, f.get("value"))
+        except QueryError:
+            raise
+        except Exception as e:
+            raise QueryError(f"Filter on `{column}` failed: {str(e)}")
+    data = df[mask] if not mask.all() else df
+
+    named = {}
+    for agg in aggregations:
+        func = agg.get("func")
+        if func not in AGG_FUNCS:
+            raise QueryError(f"Unsupported aggregation: {func}")
+        column = agg.get("column", "*")
+        if column == "*":
+            if func != "count":
+                raise QueryError("Only count can be applied to *")
+            alias = agg.get("alias") or "count"
+            named[alias] = (df.columns[0], "size")
+        else:
+            _check_column(df, column)
+            alias = agg.get("alias") or f"{func}_{column}"
+            named[alias] = (column, func)
+
+    try:
+        if group_by:
+            keys = [_group_key(data, key) for key in group_by]
+            if not named:
+                named = {"count": (df.columns[0], "size")}
+            result = data.groupby(keys, dropna=False, observed=True).agg(**named).reset_index()
+        elif named:
+            result = pd.DataFrame({alias: [data[col].agg(func) if func != "size" else len(data)]
+                                   for alias, (col, func) in named.items()})
+        else:
+            result = data
+    except QueryError:
+        raise
+    except Exception as e:
+        raise QueryError(f"Query failed: {str(e)}")
+
+    if sort:
+        by = [s.get("column") for s in sort]
+        missing = [c for c in by if c not in result.columns]
+        if missing:
+            raise QueryError(f"Cannot sort by {missing}; result columns are {list(result.columns)}")
+        result = result.sort_values(by, ascending=[_parse_bool(s.get("ascending", True)) for s in sort])
+    return result.head(limit).reset_index(drop=True)
+
+
+def format_result(result: pd.DataFrame, spec: Dict, total_rows: int) -> str:
+    """Markdown block with the query and its exact result for the answer prompt"""
+    return (
+        f"Query (computed locally over all {total_rows} rows):\n"
+        f"```json\n{json.dumps(spec, ensure_ascii=False, default=str)}\n```\n"
+        f"Result ({len(result)} rows):\n{result.to_markdown(index=False)}"
+    )
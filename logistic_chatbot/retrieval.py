@@ -0,0 +1,180 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache, frame_fingerprint
+from kpi_cube import detect_roles
+
+TOKEN_PATTERN = r"[0-9a-z]+"
+VALUE_INDEX_MAX_CARDINALITY = int(os.getenv("RETRIEVAL_VALUE_INDEX_MAX_CARDINALITY", "2000"))
+STRUCTURED_MATCH_BONUS = 2.0  # Added per exact column-value or month match
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+         ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+         ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec")],
+        start=1,
+    )
+    for name in names
+}
+
+_index_cache = LRUCache(
+    max_entries=int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "16")),
+    max_bytes=int(float(os.getenv("RETRIEVAL_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    sizeof=lambda index: index.nbytes,
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(TOKEN_PATTERN, text.lower())
+
+
+def _text(series: pd.Series) -> pd.Series:
+    """Values as strings with missing ones empty (astype(str) alone turns NaN into "nan")"""
+    return series.astype(str).where(series.notna().to_numpy(), "")
+
+
+class RowIndex:
+    """
+    BM25 index over the text columns of a dataframe
+    Postings are stored CSR-style (term offsets into flat row-id and
+    term-frequency arrays), so scoring a query only touches the rows
+    that contain its terms. Exact column values and month names in the
+    question add a fixed bonus through per-column inverted indexes.
+    """
+
+    def __init__(self, df: pd.DataFrame, text_columns: Optional[List[str]] = None,
+                 k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_rows = len(df)
+        if text_columns is None:
+            text_columns = [c for c in df.columns
+                            if not (pd.api.types.is_numeric_dtype(df[c]) or pd.api.types.is_datetime64_any_dtype(df[c]))]
+        self.text_columns = text_columns
+        self._build_postings(df)
+        self._build_value_index(df)
+        self._build_month_index(df)
+
+    def _build_postings(self, df: pd.DataFrame) -> None:
+        if not self.text_columns or self.n_rows == 0:
+            self.vocabulary: Dict[str, int] = {}
+            self.term_ptr = np.zeros(1, dtype=np.int64)
+            self.row_ids = np.zeros(0, dtype=np.int32)
+            self.tfs = np.zeros(0, dtype=np.float32)
+            self.doc_len = np.zeros(self.n_rows, dtype=np.float32)
+            self.avg_len = 1.0
+            return
+        text = _text(df[self.text_columns[0]])
+        for col in self.text_columns[1:]:
+            text = text + " " + _text(df[col])
+        tokens = text.str.lower().str.findall(TOKEN_PATTERN)
+        tokens.index = np.arange(self.n_rows)
+        exploded = tokens.explode().dropna()
+        term_ids, terms = pd.factorize(exploded.to_numpy())
+        pairs = pd.DataFrame({"term": term_ids, "row": exploded.index.to_numpy(dtype=np.int32)})
+        counts = pairs.groupby(["term", "row"]).size().reset_index(name="tf")
+
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.row_ids = counts["row"].to_numpy(dtype=np.int32)
+        self.tfs = counts["tf"].to_numpy(dtype=np.float32)
+        df_counts = np.bincount(counts["term"].to_numpy(), minlength=len(terms))
+        self.term_ptr = np.concatenate([[0], np.cumsum(df_counts)]).astype(np.int64)
+        self.idf = np.log(1 + (self.n_rows - df_counts + 0.5) / (df_counts + 0.5)).astype(np.float32)
+        self.doc_len = np.bincount(pairs["row"].to_numpy(), minlength=self.n_rows).astype(np.float32)
+        self.avg_len = float(self.doc_len.mean()) or 1.0
+
+    def _build_value_index(self, df: pd.DataFrame) -> None:
+        """
+        Exact-value inverted index of low-cardinality text columns
+        Each value is stored as its padded token phrase (" dhl express "),
+        tokenized once here rather than on every query.
+        """
+        self.value_index: Dict[str, List[Tuple[str, np.ndarray]]] = {}
+        for col in self.text_columns:
+            codes, uniques = pd.factorize(_text(df[col]).str.lower().str.strip())
+            if len(uniques) > VALUE_INDEX_MAX_CARDINALITY:
+                continue
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.value_index[col] = [
+                (f" {' '.join(tokens)} ", order[bounds[i]:bounds[i + 1]].astype(np.int32))
+                for i, value in enumerate(uniques)
+                if len(value) > 1 and (tokens := tokenize(value))
+            ]
+
+    def _build_month_index(self, df: pd.DataFrame) -> None:
+        self.date_column = detect_roles(df)["date"]
+        self.months = None
+        if self.date_column is not None:
+            dates = pd.to_datetime(df[self.date_column], errors="coerce")
+            self.months = dates.dt.month.fillna(0).to_numpy(dtype=np.int8)
+
+    @property
+    def nbytes(self) -> int:
+        size = self.row_ids.nbytes + self.tfs.nbytes + self.term_ptr.nbytes + self.doc_len.nbytes
+        size += sum(rows.nbytes + len(phrase) for index in self.value_index.values() for phrase, rows in index)
+        size += 64 * len(self.vocabulary)  # Rough cost of the vocabulary dict
+        if self.months is not None:
+            size += self.months.nbytes
+        return int(size)
+
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every row for the query, plus structured-match bonuses"""
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+            rows, tf = self.row_ids[start:end], self.tfs[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / self.avg_len)
+            # Each row appears once per term, so plain fancy-index addition is safe
+            scores[rows] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm)
+
+        lowered = f" {' '.join(tokenize(query))} "
+        for index in self.value_index.values():
+            for phrase, rows in index:
+                if phrase in lowered:
+                    scores[rows] += STRUCTURED_MATCH_BONUS
+        if self.months is not None:
+            for month in {MONTHS[t] for t in tokenize(query) if t in MONTHS}:
+                scores[self.months == month] += STRUCTURED_MATCH_BONUS
+        return scores
+
+    def search(self, query: str, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Row positions and scores of the k best matching rows (score > 0), best first"""
+        scores = self.score(query)
+        k = min(k, self.n_rows)
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+
+def get_row_index(df: pd.DataFrame, fingerprint: Optional[str] = None) -> RowIndex:
+    """Return the cached retrieval index of df, building it on first use"""
+    key = fingerprint or frame_fingerprint(df)
+    return _index_cache.get_or_compute(key, lambda: RowIndex(df))
+
+
+def retrieve_rows(df: pd.DataFrame, query: str, k: int = 10, fingerprint: Optional[str] = None) -> pd.DataFrame:
+    """
+    Top-k rows of df relevant to a question
+    Args:
+        df: Dataset the index was built over
+        query: User question
+        k: Maximum number of rows
+        fingerprint: Precomputed dataframe_fingerprint(df)
+    Returns:
+        pd.DataFrame: Matching rows, best first (empty when nothing matches)
+    """
+    positions, _ = get_row_index(df, fingerprint).search(query, k)
+    return df.iloc[positions]
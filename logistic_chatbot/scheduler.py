@@ -0,0 +1,215 @@
+import os
+import re
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Mapping, Optional
+
+# Lower runs first; interactive chat goes ahead of batch and deep-analysis work
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Local limits per LLM_RATE_WINDOW_S; 0 leaves that limit to the server's rate-limit headers and 429s
+LLM_REQUESTS_PER_MIN = float(os.getenv("LLM_REQUESTS_PER_MIN", "0"))
+LLM_TOKENS_PER_MIN = float(os.getenv("LLM_TOKENS_PER_MIN", "0"))
+LLM_RATE_WINDOW_S = float(os.getenv("LLM_RATE_WINDOW_S", "60"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)?")
+_priority = threading.local()
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in a rate-limit header value ("1.5", "7.66s", "2m59.56s", "120ms")"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value.strip())
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "": 1}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """
+    Budget of capacity units per window_s seconds, refilled continuously
+    A capacity of 0 means no local limit. Either way the server's
+    rate-limit headers cap what may be taken until their reset time.
+    """
+
+    def __init__(self, capacity: float, window_s: float = LLM_RATE_WINDOW_S):
+        self.capacity = capacity
+        self.window_s = window_s
+        self.level = capacity
+        self.allowance: Optional[float] = None  # Remaining units reported by the server
+        self.allowance_until = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / self.window_s)
+        if self.allowance is not None and now >= self.allowance_until:
+            self.allowance = None  # The server's window has reset
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 if it can be taken now)"""
+        self._refill(now)
+        wait = 0.0
+        if self.allowance is not None and self.allowance < amount:
+            wait = self.allowance_until - now
+        if self.capacity > 0:
+            # A request larger than the whole bucket goes through once the bucket is full
+            needed = min(amount, self.capacity) - self.level
+            if needed > 0:
+                wait = max(wait, needed * self.window_s / self.capacity)
+        return wait
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= amount
+        if self.allowance is not None:
+            self.allowance -= amount
+
+    def give_back(self, amount: float, now: float) -> None:
+        """Correct an estimate once the real usage is known (negative amounts charge more)"""
+        self._refill(now)
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, remaining: Optional[float], reset_s: Optional[float], now: float) -> None:
+        """Adopt the server's view: never assume more is left than it reports"""
+        self._refill(now)
+        if remaining is None:
+            return
+        if self.capacity > 0:
+            self.level = min(self.level, remaining)
+        # Responses can arrive out of order, so an older, higher count never raises the allowance
+        self.allowance = remaining if self.allowance is None else min(self.allowance, remaining)
+        self.allowance_until = max(self.allowance_until, now + (self.window_s if reset_s is None else reset_s))
+
+
+class RateLimitScheduler:
+    """
+    Process-wide gate in front of the model API
+    Callers queue by priority (then arrival) and are let through one at a
+    time when a concurrency slot is free and both the request and token
+    buckets allow it. A 429 pauses dispatch and halves the concurrency
+    limit, which then grows back by one per successful call.
+    """
+
+    def __init__(self, requests_per_min: float = LLM_REQUESTS_PER_MIN,
+                 tokens_per_min: float = LLM_TOKENS_PER_MIN, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 window_s: float = LLM_RATE_WINDOW_S):
+        self.requests = TokenBucket(requests_per_min, window_s)
+        self.tokens = TokenBucket(tokens_per_min, window_s)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens: float, priority: Optional[int] = None) -> float:
+        """
+        Block until this request may be sent
+        Args:
+            tokens: Estimated tokens of the request (prompt plus expected answer)
+            priority: Queue priority; defaults to the calling thread's request_priority
+        Returns:
+            float: Seconds spent waiting
+        """
+        started = time.monotonic()
+        entry = (current_priority() if priority is None else priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    timeout = None
+                    if self._queue[0] == entry and self.in_flight < int(self.concurrency):
+                        now = time.monotonic()
+                        timeout = max(self.paused_until - now, self.requests.wait_time(1, now),
+                                      self.tokens.wait_time(tokens, now))
+                        if timeout <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            self.in_flight += 1
+                            return time.monotonic() - started
+                    self._cond.wait(timeout)
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()  # The next in line may be able to go now
+
+    def release(self, estimated_tokens: float = 0, used_tokens: Optional[float] = None) -> None:
+        """Free the slot taken by acquire, settling the token estimate if usage is known"""
+        with self._cond:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.tokens.give_back(estimated_tokens - used_tokens, time.monotonic())
+            self._cond.notify_all()
+
+    def on_success(self, headers: Optional[Mapping] = None) -> None:
+        with self._cond:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            if headers is not None:
+                self._sync(headers)
+            self._cond.notify_all()
+
+    def on_rate_limited(self, delay: float, headers: Optional[Mapping] = None) -> None:
+        """A 429 arrived: stop dispatching for delay seconds and send fewer requests at once"""
+        with self._cond:
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.concurrency = max(1.0, self.concurrency / 2)
+            if headers is not None:
+                self._sync(headers)
+
+    def _sync(self, headers: Mapping) -> None:
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                remaining = float(remaining) if remaining is not None else None
+            except ValueError:
+                remaining = None
+            bucket.sync(remaining, parse_duration(headers.get(f"x-ratelimit-reset-{kind}")), now)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"queued": len(self._queue), "in_flight": self.in_flight,
+                    "concurrency": int(self.concurrency), "rate_limited": self.rate_limited,
+                    "paused_s": max(0.0, self.paused_until - time.monotonic())}
+
+
+def current_priority() -> int:
+    return getattr(_priority, "level", PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def request_priority(level: int) -> Iterator[None]:
+    """Queue LLM calls made by this thread at level (e.g. PRIORITY_BACKGROUND)"""
+    previous = current_priority()
+    _priority.level = level
+    try:
+        yield
+    finally:
+        _priority.level = previous
+
+
+_scheduler: Optional[RateLimitScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """Return the process-wide scheduler shared by every session"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RateLimitScheduler()
+    return _scheduler
@@ -0,0 +1,301 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", "chat_store.db")
+UUID_FILE_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.json$")
+
+# Keys stored in their own columns; everything else goes to the JSON "extra" column
+_CORE_KEYS = ("role", "content", "timestamp")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_created ON conversations (created_at);
+CREATE TABLE IF NOT EXISTS migrated_files (
+    path TEXT PRIMARY KEY,
+    migrated_at TEXT NOT NULL
+);
+"""
+
+
+# Full-text index over message content, kept in sync by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE messages_fts USING fts5(
+    content, content='messages', content_rowid='id'
+);
+CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');
+"""
+
+
+class StorageError(Exception):
+    """Raised when the conversation store cannot be read or written"""
+    pass
+
+
+class ConversationStore:
+    """
+    Append-only SQLite store of chat messages (WAL mode)
+    Each message is one row written in its own transaction, so a save
+    costs O(1) regardless of conversation length and a crash can never
+    leave a half-written history behind.
+    """
+
+    def __init__(self, path: str = CHAT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            self.has_fts = self._ensure_fts(conn)
+
+    @staticmethod
+    def _ensure_fts(conn: sqlite3.Connection) -> bool:
+        """Create the FTS index on first use; False when SQLite lacks FTS5"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            conn.executescript(_FTS_SCHEMA)
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; Streamlit runs each session in its own thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_row(conversation_id: str, message: Dict) -> tuple:
+        extra = {k: v for k, v in message.items() if k not in _CORE_KEYS}
+        return (
+            conversation_id,
+            message["role"],
+            message.get("content", ""),
+            message.get("timestamp"),
+            json.dumps(extra, ensure_ascii=False, default=str) if extra else None,
+        )
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> Dict:
+        message = {"role": row["role"], "content": row["content"]}
+        if row["timestamp"]:
+            message["timestamp"] = row["timestamp"]
+        if row["extra"]:
+            message.update(json.loads(row["extra"]))
+        message["_id"] = row["id"]
+        return message
+
+    def append_messages(self, conversation_id: str, messages: List[Dict]) -> None:
+        """Atomically append messages to a conversation"""
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT INTO messages (conversation_id, role, content, timestamp, extra) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [self._to_row(conversation_id, m) for m in messages],
+                )
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to append messages: {str(e)}")
+
+    def load_messages(self, conversation_id: str, limit: Optional[int] = None,
+                      before_id: Optional[int] = None) -> List[Dict]:
+        """
+        Load messages of a conversation in chronological order
+        Args:
+            conversation_id: Conversation to read
+            limit: Only the most recent N messages (all when None)
+            before_id: Page backwards from this message id (exclusive)
+        Returns:
+            list: Message dicts; each carries its row id under "_id"
+        """
+        query = "SELECT * FROM messages WHERE conversation_id = ?"
+        params: list = [conversation_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        try:
+            rows = self._connect().execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to load messages: {str(e)}")
+        return [self._from_row(row) for row in reversed(rows)]
+
+    def count_messages(self, conversation_id: str) -> int:
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row[0]
+
+    def clear_conversation(self, conversation_id: str) -> None:
+        """Delete every message of a conversation"""
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to clear conversation: {str(e)}")
+
+    def upsert_conversation(self, conversation: Dict) -> None:
+        """Insert or update a conversation's metadata"""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO conversations (id, title, created_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET title = excluded.title",
+                    (conversation["id"], conversation["title"], conversation["created_at"]),
+                )
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to save conversation: {str(e)}")
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict]:
+        """Look a conversation up by id"""
+        try:
+            row = self._connect().execute(
+                "SELECT id, title, created_at FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to load conversation: {str(e)}")
+        return dict(row) if row else None
+
+    def list_conversations(self, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """One page of conversations, newest first"""
+        try:
+            rows = self._connect().execute(
+                "SELECT id, title, created_at FROM conversations "
+                "ORDER BY created_at DESC, id LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to list conversations: {str(e)}")
+        return [dict(row) for row in rows]
+
+    def count_conversations(self) -> int:
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to count conversations: {str(e)}")
+
+    def search_messages(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Full-text search over message content across all conversations
+        Args:
+            query: Free text; every word must match (prefix match on the last one)
+            limit: Maximum number of hits
+        Returns:
+            list: Hits with conversation id/title, message id and a snippet, best first
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        try:
+            if self.has_fts:
+                match = " ".join(f'"{w}"' for w in words[:-1]) + f' "{words[-1]}"*'
+                rows = self._connect().execute(
+                    "SELECT m.id AS message_id, m.conversation_id, c.title, "
+                    "snippet(messages_fts, 0, '**', '**', '…', 12) AS snippet "
+                    "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                    "LEFT JOIN conversations c ON c.id = m.conversation_id "
+                    "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (match.strip(), limit),
+                ).fetchall()
+            else:
+                where = " AND ".join("m.content LIKE ?" for _ in words)
+                rows = self._connect().execute(
+                    "SELECT m.id AS message_id, m.conversation_id, c.title, "
+                    "substr(m.content, 1, 120) AS snippet "
+                    "FROM messages m LEFT JOIN conversations c ON c.id = m.conversation_id "
+                    f"WHERE {where} ORDER BY m.id DESC LIMIT ?",
+                    [f"%{w}%" for w in words] + [limit],
+                ).fetchall()
+        except sqlite3.Error as e:
+            raise StorageError(f"Search failed: {str(e)}")
+        return [dict(row) for row in rows]
+
+    def migrate_json_files(self, directory: str = ".", metadata_file: str = "conversations.json") -> int:
+        """
+        Import legacy <uuid>.json histories and conversations.json
+        Each file is imported once; the originals are left untouched.
+        Returns:
+            int: Number of files imported by this call
+        """
+        imported = 0
+        conn = self._connect()
+        done = {row[0] for row in conn.execute("SELECT path FROM migrated_files")}
+
+        metadata_path = os.path.join(directory, metadata_file)
+        if os.path.exists(metadata_path) and os.path.abspath(metadata_path) not in done:
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                conversations = json.load(f)
+            with conn:
+                for conv in conversations:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO conversations (id, title, created_at) VALUES (?, ?, ?)",
+                        (conv["id"], conv.get("title", conv["id"]), conv.get("created_at") or datetime.now().isoformat()),
+                    )
+                self._mark_migrated(conn, metadata_path)
+            imported += 1
+
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not UUID_FILE_PATTERN.match(name) or os.path.abspath(path) in done:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    history = json.load(f)
+            except (IOError, ValueError):
+                continue
+            conversation_id = name[:-len(".json")]
+            created_at = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO messages (conversation_id, role, content, timestamp, extra) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [self._to_row(conversation_id, m) for m in history if "role" in m],
+                )
+                conn.execute(
+                    "INSERT OR IGNORE INTO conversations (id, title, created_at) VALUES (?, ?, ?)",
+                    (conversation_id, conversation_id, created_at),
+                )
+                self._mark_migrated(conn, path)
+            imported += 1
+        return imported
+
+    @staticmethod
+    def _mark_migrated(conn: sqlite3.Connection, path: str) -> None:
+        conn.execute(
+            "INSERT OR IGNORE INTO migrated_files (path, migrated_at) VALUES (?, ?)",
+            (os.path.abspath(path), datetime.now().isoformat()),
+        )
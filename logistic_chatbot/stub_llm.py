@@ -0,0 +1,234 @@
+"""
+Local stub of the Groq chat-completions API for offline development
+
+Run it and point the app at it:
+    python stub_llm.py --port 8765 --latency 0.2
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub streamlit run app.py
+"""
+import json
+import time
+import uuid
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class StubConfig:
+    """Behaviour knobs of the stub server, adjustable while it runs"""
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0,
+                 reply: Optional[str] = None, fail_first: int = 0, fail_status: int = 429,
+                 requests_per_window: int = 0, tokens_per_window: int = 0, window_s: float = 60.0):
+        self.latency = latency          # Seconds before the first byte
+        self.token_delay = token_delay  # Seconds between streamed chunks
+        self.reply = reply              # Fixed answer; echoes the prompt when None
+        self.fail_first = fail_first    # Number of requests to reject before succeeding
+        self.fail_status = fail_status
+        # Sliding-window rate limits like the real API's; 0 disables a limit
+        self.requests_per_window = requests_per_window
+        self.tokens_per_window = tokens_per_window
+        self.window_s = window_s
+        self.requests = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self._admitted = deque()  # (time, tokens) of requests inside the window
+
+    def admit(self, tokens: int) -> dict:
+        """
+        Apply the rate limits to a request (call with lock held)
+        Returns:
+            dict: Rate-limit headers; includes retry-after when the request is rejected
+        """
+        now = time.monotonic()
+        while self._admitted and self._admitted[0][0] <= now - self.window_s:
+            self._admitted.popleft()
+        used_requests = len(self._admitted)
+        used_tokens = sum(t for _, t in self._admitted)
+        over = (self.requests_per_window and used_requests + 1 > self.requests_per_window) or \
+               (self.tokens_per_window and used_tokens + tokens > self.tokens_per_window)
+        if not over:
+            self._admitted.append((now, tokens))
+            used_requests, used_tokens = used_requests + 1, used_tokens + tokens
+        # The window frees up as its oldest request expires
+        reset = f"{max(0.0, self._admitted[0][0] + self.window_s - now):.3f}s" if self._admitted else "0s"
+        headers = {}
+        for kind, limit, used in (("requests", self.requests_per_window, used_requests),
+                                  ("tokens", self.tokens_per_window, used_tokens)):
+            if limit:
+                headers.update({f"x-ratelimit-limit-{kind}": str(limit),
+                                f"x-ratelimit-remaining-{kind}": str(max(0, limit - used)),
+                                f"x-ratelimit-reset-{kind}": reset})
+        if over:
+            self.rate_limited += 1
+            headers["retry-after"] = reset.rstrip("s")
+        return headers
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    config: StubConfig = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        config = self.config
+        text = config.reply if config.reply is not None else self._echo(body)
+        with config.lock:
+            config.requests += 1
+            failing = config.requests <= config.fail_first
+            limits = config.admit(self._usage(body, text)["total_tokens"])
+            config.in_flight += 1
+            config.max_in_flight = max(config.max_in_flight, config.in_flight)
+        try:
+            if failing:
+                self._send_json(config.fail_status, {"error": {"message": "stub failure"}},
+                                headers={"retry-after": "0"})
+                return
+            if "retry-after" in limits:
+                self._send_json(429, {"error": {"message": "rate limit exceeded", "type": "tokens"}},
+                                headers=limits)
+                return
+            time.sleep(config.latency)
+            if body.get("stream"):
+                self._send_stream(body, text, limits)
+            else:
+                self._send_json(200, self._completion(body, text), headers=limits)
+        finally:
+            with config.lock:
+                config.in_flight -= 1
+
+    @staticmethod
+    def _echo(body: dict) -> str:
+        messages = body.get("messages") or [{}]
+        return f"Stub answer to: {messages[-1].get('content', '')[:200]}"
+
+    @staticmethod
+    def _usage(body: dict, text: str) -> dict:
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+        prompt_tokens, completion_tokens = prompt_chars // 4, len(text) // 4
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _completion(self, body: dict, text: str) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": self._usage(body, text),
+        }
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, body: dict, text: str, headers: Optional[dict] = None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            event = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.config.token_delay:
+                time.sleep(self.config.token_delay)
+        # Like the real API, usage arrives on a final chunk without content
+        final = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": body.get("model", "stub"),
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                 "x_groq": {"usage": self._usage(body, text)}}
+        self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class StubLLMServer:
+    """Threaded stub server; usable as a context manager in scripts and benchmarks"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        handler = type("Handler", (_Handler,), {"config": self.config})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the chat-completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--reply", default=None, help="fixed reply text")
+    parser.add_argument("--rpm", type=int, default=0, help="requests allowed per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="tokens allowed per minute (0 = unlimited)")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.token_delay, args.reply,
+                        requests_per_window=args.rpm, tokens_per_window=args.tpm)
+    server = StubLLMServer(args.host, args.port, config)
+    print(f"Stub LLM listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
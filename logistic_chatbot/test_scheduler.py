@@ -0,0 +1,105 @@
+"""
+Scheduler behaviour against the local stub server
+
+    python -m pytest logistic_chatbot/test_scheduler.py
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import llm_client
+import scheduler
+from scheduler import RateLimitScheduler
+from stub_llm import StubConfig, StubLLMServer
+
+MAX_CONCURRENCY = 8
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Start a stub server with the given StubConfig knobs and point a fresh client and scheduler at it"""
+    servers = []
+
+    def start(**config) -> StubLLMServer:
+        server = StubLLMServer(config=StubConfig(**config)).start()
+        servers.append(server)
+        monkeypatch.setenv("GROQ_API_KEY", "test")
+        monkeypatch.setattr(llm_client, "GROQ_BASE_URL", server.base_url)
+        monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", 10)
+        monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE_S", 0.05)
+        monkeypatch.setattr(scheduler, "_scheduler", RateLimitScheduler(max_concurrency=MAX_CONCURRENCY))
+        llm_client.reset_client()
+        return server
+
+    yield start
+    llm_client.reset_client()
+    for server in servers:
+        server.stop()
+
+
+def _ask(prompt: str) -> str:
+    response = llm_client.create_chat_completion(
+        model="test", messages=[{"role": "user", "content": prompt}], max_tokens=50)
+    return response.choices[0].message.content
+
+
+def test_rate_limited_calls_all_succeed(stub):
+    server = stub(requests_per_window=3, window_s=1.0)
+    prompts = [f"question {i}" for i in range(MAX_CONCURRENCY)]
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        answers = list(pool.map(_ask, prompts))
+
+    assert answers == [f"Stub answer to: {p}" for p in prompts]
+    stats = scheduler.get_scheduler().stats()
+    # The first burst goes out before the server's limits are known, so some calls see 429s
+    assert server.config.rate_limited > 0
+    assert stats["rate_limited"] == server.config.rate_limited
+    assert server.config.requests == len(prompts) + server.config.rate_limited
+    # Every 429 is followed by that caller's successful retry, which grows the limit back above the floor
+    assert stats["concurrency"] > 1
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+
+def test_concurrency_halves_on_429_and_recovers():
+    limiter = RateLimitScheduler(max_concurrency=MAX_CONCURRENCY)
+    limiter.on_rate_limited(0.0)
+    limiter.on_rate_limited(0.0)
+    assert limiter.stats()["concurrency"] == MAX_CONCURRENCY // 4
+    for _ in range(MAX_CONCURRENCY):
+        limiter.on_success()
+    assert limiter.stats()["concurrency"] == MAX_CONCURRENCY
+
+
+def test_identical_concurrent_calls_share_one_request(stub):
+    server = stub(latency=0.3)
+    callers = 5
+    barrier = threading.Barrier(callers)
+
+    def ask() -> str:
+        barrier.wait()
+        return _ask("same question")
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        answers = list(pool.map(lambda _: ask(), range(callers)))
+
+    assert answers == ["Stub answer to: same question"] * callers
+    assert server.config.requests == 1
+
+
+def test_identical_concurrent_streams_share_one_request(stub):
+    server = stub(latency=0.3)
+    callers = 3
+    barrier = threading.Barrier(callers)
+
+    def read() -> str:
+        barrier.wait()
+        chunks = llm_client.stream_chat_completion(
+            model="test", messages=[{"role": "user", "content": "same stream"}], max_tokens=50)
+        return "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        answers = list(pool.map(lambda _: read(), range(callers)))
+
+    assert answers == ["Stub answer to: same stream"] * callers
+    assert server.config.requests == 1
@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+from typing import Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join("logs", "trace.log"))
+TRACE_LOG_MAX_BYTES = int(float(os.getenv("TRACE_LOG_MAX_MB", "10")) * 1024 * 1024)
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "5"))
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "1000"))  # Recent spans per stage kept for percentiles
+TRACE_METRICS_HOST = os.getenv("TRACE_METRICS_HOST", "127.0.0.1")
+TRACE_METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT", "0"))  # 0 disables the /metrics endpoint
+
+# Span attributes exported as Prometheus summaries / counters
+TIMING_ATTRS = ("queue_wait_s", "ttft_s")
+SIZE_ATTRS = ("data_context_chars", "prompt_chars")
+TOKEN_ATTRS = ("prompt_tokens", "completion_tokens")
+
+_local = threading.local()
+_lock = threading.Lock()
+_durations: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=TRACE_WINDOW))
+_attr_values: Dict[tuple, Deque[float]] = defaultdict(lambda: deque(maxlen=TRACE_WINDOW))
+_counts: Dict[str, int] = defaultdict(int)
+_errors: Dict[str, int] = defaultdict(int)
+_sums: Dict[str, float] = defaultdict(float)
+_tokens: Dict[tuple, int] = defaultdict(int)
+_logger: Optional[logging.Logger] = None
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+
+class Span:
+    """
+    One timed stage of a request
+    Spans opened while another span is active on the same thread join its
+    trace, so every stage of a chat turn shares one trace id.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        self.started_at = datetime.now().isoformat()
+        self._started = time.perf_counter()
+        self.duration_s: Optional[float] = None
+
+    def set(self, **attrs) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        """Close the span and export it; later calls are ignored"""
+        if self.duration_s is not None:
+            return
+        self.duration_s = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _export(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.started_at,
+            "duration_s": self.duration_s,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+def _stack() -> List[Span]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_span() -> Optional[Span]:
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def start_span(name: str, **attrs) -> Span:
+    """
+    Open a span without making it current
+    For work that yields control (streams): activate it around each step
+    and call end() when done.
+    """
+    return Span(name, parent=current_span(), **attrs)
+
+
+@contextmanager
+def activate(span: Span) -> Iterator[Span]:
+    """Make span the parent of spans opened in this block, without ending it"""
+    stack = _stack()
+    stack.append(span)
+    try:
+        yield span
+    finally:
+        stack.remove(span)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time a block as a child of the current span; exceptions are recorded and re-raised"""
+    s = start_span(name, **attrs)
+    try:
+        with activate(s):
+            yield s
+    except BaseException as e:
+        s.end(error=e)
+        raise
+    s.end()
+
+
+def annotate(**attrs) -> None:
+    """Add attributes to the current span, if any"""
+    s = current_span()
+    if s is not None:
+        s.set(**attrs)
+
+
+def _get_logger() -> Optional[logging.Logger]:
+    global _logger
+    if _logger is None and TRACE_LOG_PATH:
+        logger = logging.getLogger("logistic_chatbot.trace")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            try:
+                directory = os.path.dirname(TRACE_LOG_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                handler = RotatingFileHandler(TRACE_LOG_PATH, maxBytes=TRACE_LOG_MAX_BYTES,
+                                              backupCount=TRACE_LOG_BACKUPS, encoding="utf-8")
+            except OSError:
+                # Tracing must never break the app; keep in-memory metrics only
+                handler = logging.NullHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+def _export(s: Span) -> None:
+    if not TRACE_ENABLED:
+        return
+    with _lock:
+        _durations[s.name].append(s.duration_s)
+        _counts[s.name] += 1
+        _sums[s.name] += s.duration_s
+        if s.error:
+            _errors[s.name] += 1
+        for attr in TIMING_ATTRS + SIZE_ATTRS:
+            value = s.attrs.get(attr)
+            if isinstance(value, (int, float)):
+                _attr_values[(s.name, attr)].append(float(value))
+        for attr in TOKEN_ATTRS:
+            value = s.attrs.get(attr)
+            if isinstance(value, int):
+                _tokens[(s.name, attr)] += value
+    logger = _get_logger()
+    if logger is not None:
+        logger.info(json.dumps(s.to_dict(), ensure_ascii=False, default=str))
+
+
+def _percentiles(values) -> Dict[str, float]:
+    data = np.fromiter(values, dtype=float)
+    if data.size == 0:
+        return {"p50": float("nan"), "p95": float("nan"), "max": float("nan")}
+    p50, p95 = np.percentile(data, [50, 95])
+    return {"p50": float(p50), "p95": float(p95), "max": float(data.max())}
+
+
+def stage_stats() -> List[Dict]:
+    """
+    Latency percentiles per stage over the recent window
+    Returns:
+        list: One dict per stage with count, errors, p50_s, p95_s, max_s
+              and p50/p95 of the timing and size attributes it carries
+    """
+    with _lock:
+        durations = {name: list(values) for name, values in _durations.items()}
+        attrs = {key: list(values) for key, values in _attr_values.items()}
+        counts, errors = dict(_counts), dict(_errors)
+    stats = []
+    for name in sorted(durations):
+        p = _percentiles(durations[name])
+        row = {"stage": name, "count": counts[name], "errors": errors.get(name, 0),
+               "p50_s": p["p50"], "p95_s": p["p95"], "max_s": p["max"]}
+        for (stage, attr), values in attrs.items():
+            if stage == name:
+                q = _percentiles(values)
+                row[f"{attr}_p50"] = q["p50"]
+                row[f"{attr}_p95"] = q["p95"]
+        stats.append(row)
+    return stats
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus() -> str:
+    """All stage metrics in the Prometheus text exposition format"""
+    with _lock:
+        durations = {name: list(values) for name, values in _durations.items()}
+        attrs = {key: list(values) for key, values in _attr_values.items()}
+        counts, errors, sums, tokens = dict(_counts), dict(_errors), dict(_sums), dict(_tokens)
+
+    lines = [
+        "# HELP chatbot_stage_duration_seconds Duration of each request stage (quantiles over the recent window)",
+        "# TYPE chatbot_stage_duration_seconds summary",
+    ]
+    for name in sorted(durations):
+        p = _percentiles(durations[name])
+        for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+            lines.append(f'chatbot_stage_duration_seconds{{stage="{_label(name)}",quantile="{quantile}"}} {p[key]}')
+        lines.append(f'chatbot_stage_duration_seconds_sum{{stage="{_label(name)}"}} {sums[name]}')
+        lines.append(f'chatbot_stage_duration_seconds_count{{stage="{_label(name)}"}} {counts[name]}')
+
+    lines += ["# HELP chatbot_stage_errors_total Stages that ended with an exception",
+              "# TYPE chatbot_stage_errors_total counter"]
+    for name in sorted(counts):
+        lines.append(f'chatbot_stage_errors_total{{stage="{_label(name)}"}} {errors.get(name, 0)}')
+
+    for attr in TIMING_ATTRS + SIZE_ATTRS:
+        metric = f"chatbot_{attr[:-2]}_seconds" if attr.endswith("_s") else f"chatbot_{attr}"
+        series = sorted((stage, values) for (stage, a), values in attrs.items() if a == attr)
+        if not series:
+            continue
+        lines += [f"# HELP {metric} {attr} recorded on spans", f"# TYPE {metric} summary"]
+        for stage, values in series:
+            p = _percentiles(values)
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                lines.append(f'{metric}{{stage="{_label(stage)}",quantile="{quantile}"}} {p[key]}')
+
+    lines += ["# HELP chatbot_llm_tokens_total Prompt and completion tokens sent to / received from the LLM",
+              "# TYPE chatbot_llm_tokens_total counter"]
+    for (stage, attr), value in sorted(tokens.items()):
+        kind = attr.split("_")[0]
+        lines.append(f'chatbot_llm_tokens_total{{stage="{_label(stage)}",kind="{kind}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_metrics_server(port: int = TRACE_METRICS_PORT, host: str = TRACE_METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve GET /metrics from a daemon thread (once per process)
+    Returns:
+        The running server, or None when port is 0 or already in use
+    """
+    global _metrics_server
+    with _lock:
+        if _metrics_server is not None or not port:
+            return _metrics_server
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError:
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        _metrics_server = server
+    return server
+
+
+def reset_metrics() -> None:
+    """Forget all recorded spans (tests and benchmarks)"""
+    with _lock:
+        for store in (_durations, _attr_values, _counts, _errors, _sums, _tokens):
+            store.clear()
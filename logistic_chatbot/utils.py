@@ -1,10 +1,34 @@
 import os
 import json
+import time
 import pandas as pd
 from groq import Groq
 from dotenv import load_dotenv
-from typing import List, Dict, Optional
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
+import tracing
+from cache import LRUCache, frame_fingerprint
+from kpi_cube import get_kpi_cube
+from profiling import profile_frame
+from retrieval import retrieve_rows
+from storage import ConversationStore, StorageError
+from context_builder import SUMMARY_SYSTEM_CONTENT, build_messages, count_tokens, history_digest
+from response_cache import ResponseCache, make_key
+from query_engine import (
+    QueryError,
+    build_planner_prompt,
+    describe_schema,
+    execute_query,
+    format_result,
+    parse_query
+)
+from llm_client import (
+    MissingAPIKeyError,
+    create_chat_completion,
+    get_client,
+    stream_chat_completion
+)
 
 # Load environment variables
 load_dotenv()
@@ -14,119 +38,457 @@ class ChatbotError(Exception):
     pass
 
 def get_groq_client() -> Groq:
-    """Initialize and return Groq client with API key"""
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise ChatbotError("GROQ_API_KEY not found in environment variables")
-    return Groq(api_key=api_key)
+    """Return the shared, connection-pooled Groq client"""
+    try:
+        return get_client()
+    except MissingAPIKeyError as e:
+        raise ChatbotError(str(e))
+
+# Process-wide summary cache shared by every Streamlit session
+_summary_cache = LRUCache(
+    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "64")),
+    max_bytes=int(float(os.getenv("SUMMARY_CACHE_MAX_MB", "16")) * 1024 * 1024),
+)
 
-def summarize_data(df: pd.DataFrame, sample_size: int = 3) -> str:
+def summarize_data(df: pd.DataFrame, sample_size: int = 3, use_cache: bool = True,
+                   fingerprint: Optional[str] = None) -> str:
     """
     Generate a comprehensive summary of the dataframe
     Args:
         df: DataFrame to summarize
         sample_size: Number of sample values to show for text columns
+        use_cache: Reuse a previously computed summary of identical data
+        fingerprint: Precomputed dataframe_fingerprint(df), if the caller has it
     Returns:
         str: Markdown-formatted summary
     """
+    with tracing.span("summarize", rows=len(df), columns=len(df.columns)) as span:
+        if not use_cache:
+            summary = _compute_summary(df, sample_size)
+            span.set(cached=False, chars=len(summary))
+            return summary
+        try:
+            key = (fingerprint or frame_fingerprint(df), sample_size)
+        except Exception as e:
+            raise ChatbotError(f"Data summarization error: {str(e)}")
+        computed = []
+
+        def compute() -> str:
+            computed.append(True)
+            return _compute_summary(df, sample_size)
+
+        # One lookup per call, so the cache's hit/miss counts stay accurate
+        summary = _summary_cache.get_or_compute(key, compute)
+        span.set(cached=not computed, chars=len(summary))
+        return summary
+
+def _compute_summary(df: pd.DataFrame, sample_size: int) -> str:
+    """Build the markdown summary without consulting the cache"""
     try:
-        summary = [
-            f"## Data Summary ({len(df)} rows × {len(df.columns)} columns)",
-            f"**Columns:** {', '.join(f'`{col}`' for col in df.columns)}",
-            f"**Missing values:** {df.isna().sum().sum()} total",
-        ]
-        
-        # Numeric columns analysis
-        numeric_cols = df.select_dtypes(include='number').columns
-        if not numeric_cols.empty:
-            summary.append("\n### Numeric Columns")
-            stats = df[numeric_cols].describe().transpose()
-            stats['range'] = stats['max'] - stats['min']
-            summary.append(stats[['mean', 'min', 'max', 'range', 'std']].to_markdown())
-        
-        # Text columns analysis
-        text_cols = df.select_dtypes(include=['object', 'string']).columns
-        if not text_cols.empty:
-            summary.append("\n### Text Columns")
-            for col in text_cols:
-                unique_count = df[col].nunique()
-                sample_values = df[col].dropna().sample(min(sample_size, len(df))).tolist()  # Fixed here
-                summary.append(
-                    f"- `{col}`: {unique_count} unique values\n"
-                    f"  Sample: {', '.join(str(v) for v in sample_values)}"
-                )
-        
-        # Date columns analysis
-        date_cols = df.select_dtypes(include=['datetime', 'datetimetz']).columns
-        if not date_cols.empty:
-            summary.append("\n### Date Columns")
-            for col in date_cols:
-                date_range = f"{df[col].min()} to {df[col].max()}"
-                summary.append(f"- `{col}`: {date_range}")
-        
-        return "\n".join(summary)
+        # Seeded samples make the summary a pure function of the data
+        return profile_frame(df).summary_markdown(sample_size)
     except Exception as e:
         raise ChatbotError(f"Data summarization error: {str(e)}")
 
-def ask_gpt(prompt: str, system_content: str = None) -> str:
-    """Get response from LLM with proper error handling"""
-    if not system_content:
-        system_content = """You are an expert Logistics and Supply Chain AI Assistant.
+DEFAULT_MODEL = "llama3-70b-8192"
+DEFAULT_SYSTEM_CONTENT = """You are an expert Logistics and Supply Chain AI Assistant.
         Provide accurate, concise answers with practical recommendations."""
-    
-    client = get_groq_client()
+DEFAULT_DATA_SYSTEM_CONTENT = """You are an expert Logistics and Supply Chain AI Assistant
+        skilled at data analysis and visualization."""
+
+SAMPLING_PARAMS = {
+    "temperature": 0.3,
+    "max_tokens": 4000,  # Increased for data analysis
+    "top_p": 0.9,
+}
+
+# Timing of recent LLM calls, newest last
+_generation_metrics: Deque[Dict] = deque(maxlen=int(os.getenv("GENERATION_METRICS_SIZE", "500")))
+
+def _record_generation(started: float, first_token_at: Optional[float], chars: int, streamed: bool,
+                       cached: bool = False) -> Dict:
+    """Store time-to-first-token and total generation time of one call"""
+    finished = time.perf_counter()
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "streamed": streamed,
+        "cached": cached,
+        "ttft_s": (first_token_at - started) if first_token_at is not None else None,
+        "total_s": finished - started,
+        "chars": chars,
+    }
+    _generation_metrics.append(entry)
+    return entry
+
+def get_generation_metrics() -> List[Dict]:
+    """Return timing records of recent LLM calls (oldest first)"""
+    return list(_generation_metrics)
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the persistent response cache, or None if it cannot be opened"""
+    global _response_cache
+    if _response_cache is None:
+        try:
+            _response_cache = ResponseCache()
+        except Exception:
+            return None
+    return _response_cache
+
+def _cache_key(prompt: str, system_content: Optional[str], history: Optional[List[Dict]],
+               dataset_fingerprint: Optional[str]) -> str:
+    # Built from the raw inputs, so a hit needs no context assembly (and no summarization call);
+    # earlier turns change the answer, so their digest is part of the key
+    digest = history_digest(history)
+    prompt = f"history:{digest}\n\n{prompt}" if digest else prompt
+    return make_key(prompt, system_content or DEFAULT_SYSTEM_CONTENT, DEFAULT_MODEL, SAMPLING_PARAMS,
+                    dataset_fingerprint)
+
+def _usage_attrs(usage, messages: List[Dict], completion: str) -> Dict:
+    """Token counts reported by the API, or local estimates when it reports none"""
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return {"prompt_tokens": int(usage.prompt_tokens),
+                "completion_tokens": int(usage.completion_tokens or 0), "tokens_estimated": False}
+    return {"prompt_tokens": sum(count_tokens(m["content"]) for m in messages),
+            "completion_tokens": count_tokens(completion), "tokens_estimated": True}
+
+def _summarize_history(request: str) -> str:
+    return ask_gpt(request, SUMMARY_SYSTEM_CONTENT)
+
+def _build_messages(prompt: str, system_content: Optional[str], history: Optional[List[Dict]] = None,
+                    conversation_id: Optional[str] = None) -> List[Dict]:
+    """System message, rolling summary and recent turns that fit the model's context window"""
+    return build_messages(prompt, system_content or DEFAULT_SYSTEM_CONTENT, history,
+                          model=DEFAULT_MODEL, max_output_tokens=SAMPLING_PARAMS["max_tokens"],
+                          summarize=_summarize_history, conversation_id=conversation_id)
+
+def ask_gpt(prompt: str, system_content: str = None, dataset_fingerprint: str = None,
+            use_cache: bool = True, history: Optional[List[Dict]] = None,
+            conversation_id: Optional[str] = None) -> str:
+    """
+    Get response from LLM with proper error handling
+    Args:
+        prompt: User question
+        system_content: Optional custom system message
+        dataset_fingerprint: Identity of the data the prompt refers to, part of the cache key
+        use_cache: Set False to bypass the response cache
+        history: Earlier messages of the conversation, oldest first
+        conversation_id: Conversation the history belongs to (keys its rolling summary)
+    Returns:
+        str: Generated response
+    """
+    started = time.perf_counter()
+    with tracing.span("llm", model=DEFAULT_MODEL, streamed=False) as span:
+        cache = get_response_cache() if use_cache else None
+        key = _cache_key(prompt, system_content, history, dataset_fingerprint) if cache else None
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                _record_generation(started, time.perf_counter(), len(cached), streamed=False, cached=True)
+                span.set(cached=True, chars=len(cached))
+                return cached
+
+        messages = _build_messages(prompt, system_content, history, conversation_id)
+        span.set(prompt_chars=sum(len(m["content"]) for m in messages), context_messages=len(messages))
+        get_groq_client()  # Fail fast with a clear error when the API key is missing
+        try:
+            response = create_chat_completion(
+                model=DEFAULT_MODEL,
+                messages=messages,
+                **SAMPLING_PARAMS
+            )
+            content = response.choices[0].message.content
+        except Exception as e:
+            raise ChatbotError(f"API Error: {str(e)}")
+        # Without streaming the first token arrives together with the last one
+        entry = _record_generation(started, time.perf_counter(), len(content or ""), streamed=False)
+        span.set(cached=False, chars=entry["chars"], ttft_s=entry["ttft_s"],
+                 **_usage_attrs(getattr(response, "usage", None), messages, content or ""))
+        if cache:
+            cache.put(key, content)
+        return content
+
+def ask_gpt_stream(prompt: str, system_content: str = None, dataset_fingerprint: str = None,
+                   use_cache: bool = True, history: Optional[List[Dict]] = None,
+                   conversation_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Stream the LLM response chunk by chunk as it is generated
+    Args:
+        prompt: User question
+        system_content: Optional custom system message
+        dataset_fingerprint: Identity of the data the prompt refers to, part of the cache key
+        use_cache: Set False to bypass the response cache
+        history: Earlier messages of the conversation, oldest first
+        conversation_id: Conversation the history belongs to (keys its rolling summary)
+    Yields:
+        str: Text chunks in arrival order (a cached answer arrives as one chunk)
+    """
+    started = time.perf_counter()
+    # Not made current while suspended at a yield; activated only around upstream reads
+    span = tracing.start_span("llm", model=DEFAULT_MODEL, streamed=True)
+    cache = get_response_cache() if use_cache else None
+    key = _cache_key(prompt, system_content, history, dataset_fingerprint) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            _record_generation(started, time.perf_counter(), len(cached), streamed=True, cached=True)
+            span.set(cached=True, chars=len(cached))
+            span.end()
+            yield cached
+            return
+
+    try:
+        with tracing.activate(span):
+            messages = _build_messages(prompt, system_content, history, conversation_id)
+    except Exception as e:
+        span.end(error=e)
+        raise
+    span.set(prompt_chars=sum(len(m["content"]) for m in messages), context_messages=len(messages))
+
+    first_token_at = None
+    chunks = []
+    completed = False
+    usage = None
+    error = None
     
     try:
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[
-                {"role": "system", "content": system_content},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.3,
-            max_tokens=4000,  # Increased for data analysis
-            top_p=0.9
+        get_groq_client()  # Fail fast with a clear error when the API key is missing
+        stream = stream_chat_completion(
+            model=DEFAULT_MODEL,
+            messages=messages,
+            **SAMPLING_PARAMS
         )
-        return response.choices[0].message.content
+        while True:
+            with tracing.activate(span):
+                chunk = next(stream, None)
+            if chunk is None:
+                break
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            chunks.append(delta)
+            yield delta
+        completed = True
+    except ChatbotError as e:
+        error = e
+        raise
     except Exception as e:
+        error = e
         raise ChatbotError(f"API Error: {str(e)}")
+    finally:
+        text = "".join(chunks)
+        entry = _record_generation(started, first_token_at, len(text), streamed=True)
+        span.set(cached=False, chars=len(text), ttft_s=entry["ttft_s"], completed=completed,
+                 **_usage_attrs(usage, messages, text))
+        span.end(error=error)
+        # Only complete answers are cached; an abandoned stream is not
+        if cache and completed:
+            cache.put(key, text)
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+
+def _evidence_block(prompt: str, df: pd.DataFrame, fingerprint: str) -> str:
+    """Markdown table of the rows most relevant to the question, or "" if none match"""
+    if RETRIEVAL_TOP_K <= 0:
+        return ""
+    try:
+        rows = retrieve_rows(df, prompt, k=RETRIEVAL_TOP_K, fingerprint=fingerprint)
+    except Exception:
+        # Retrieval only enriches the prompt; never fail the answer because of it
+        return ""
+    if rows.empty:
+        return ""
+    return f"Most relevant records ({len(rows)} of {len(df)}):\n{rows.to_markdown()}"
 
-def ask_gpt_with_data(prompt: str, df: pd.DataFrame, system_content: str = None) -> str:
+def _build_data_prompts(prompt: str, df: pd.DataFrame, system_content: Optional[str],
+                        data_context: Optional[str] = None) -> Tuple[str, str, str]:
+    """Return (user prompt, system message, dataset fingerprint) enriched with the data summary"""
+    with tracing.span("prompt", mode="summary") as span:
+        if not system_content:
+            system_content = DEFAULT_DATA_SYSTEM_CONTENT
+    
+        try:
+            fingerprint = frame_fingerprint(df)
+        except Exception as e:
+            raise ChatbotError(f"Data summarization error: {str(e)}")
+        if data_context is None:
+            data_context = summarize_data(df, fingerprint=fingerprint)
+            # Precomputed aggregates answer most totals/trend questions without row scans
+            try:
+                kpi_context = get_kpi_cube(df, fingerprint=fingerprint).to_markdown()
+            except Exception:
+                kpi_context = ""
+            if kpi_context:
+                data_context = f"{data_context}\n\n{kpi_context}"
+            evidence = _evidence_block(prompt, df, fingerprint)
+        else:
+            # Large-file mode only holds a sample, so row retrieval would miss most records
+            evidence = ""
+        full_system = f"""
+        {system_content}
+        You are analyzing logistics data with these characteristics:
+        {data_context}
+        Provide specific insights from the data when possible.
+        """
+    
+        # The data context goes in the system message only; repeating it here doubled the prompt
+        enhanced_prompt = f"""
+        When answering this logistics question: {prompt}
+        {evidence}
+        Provide specific numbers and insights from the data where relevant.
+        """
+        span.set(data_context_chars=len(data_context), evidence_chars=len(evidence),
+                 prompt_chars=len(enhanced_prompt) + len(full_system))
+        return enhanced_prompt, full_system, fingerprint
+
+def ask_gpt_with_data(prompt: str, df: pd.DataFrame, system_content: str = None,
+                      data_context: str = None, use_cache: bool = True,
+                      history: Optional[List[Dict]] = None, conversation_id: Optional[str] = None) -> str:
     """
     Enhanced version that includes full data context
     Args:
         prompt: User question
         df: DataFrame to analyze
         system_content: Optional custom system message
+        data_context: Precomputed summary (e.g. from a streamed large file) used instead of summarizing df
+        use_cache: Set False to bypass the response cache
+        history: Earlier messages of the conversation, oldest first
+        conversation_id: Conversation the history belongs to
     Returns:
         str: Generated response
     """
-    if not system_content:
-        system_content = """You are an expert Logistics and Supply Chain AI Assistant
-        skilled at data analysis and visualization."""
-    
-    data_context = summarize_data(df)
-    full_system = f"""
-    {system_content}
-    You are analyzing logistics data with these characteristics:
-    {data_context}
-    Provide specific insights from the data when possible.
+    enhanced_prompt, full_system, fingerprint = _build_data_prompts(prompt, df, system_content, data_context)
+    return ask_gpt(enhanced_prompt, full_system, dataset_fingerprint=fingerprint, use_cache=use_cache,
+                   history=history, conversation_id=conversation_id)
+
+def ask_gpt_with_data_stream(prompt: str, df: pd.DataFrame, system_content: str = None,
+                             data_context: str = None, use_cache: bool = True,
+                             history: Optional[List[Dict]] = None,
+                             conversation_id: Optional[str] = None) -> Iterator[str]:
+    """Streaming counterpart of ask_gpt_with_data; the data context is built eagerly"""
+    enhanced_prompt, full_system, fingerprint = _build_data_prompts(prompt, df, system_content, data_context)
+    return ask_gpt_stream(enhanced_prompt, full_system, dataset_fingerprint=fingerprint, use_cache=use_cache,
+                          history=history, conversation_id=conversation_id)
+
+QUERY_PLANNER_SYSTEM = """You translate logistics data questions into JSON table queries.
+        Reply with a single JSON object and nothing else."""
+
+def get_data_schema(df: pd.DataFrame, fingerprint: str = None) -> str:
+    """Cached query-planner schema of df (see describe_schema)"""
+    try:
+        fingerprint = fingerprint or frame_fingerprint(df)
+        return _summary_cache.get_or_compute((fingerprint, "schema"), lambda: describe_schema(df))
+    except Exception as e:
+        raise ChatbotError(f"Data summarization error: {str(e)}")
+
+def run_data_query(prompt: str, df: pd.DataFrame, fingerprint: str = None,
+                   use_cache: bool = True, history: Optional[List[Dict]] = None,
+                   conversation_id: Optional[str] = None) -> Optional[Dict]:
     """
-    
-    enhanced_prompt = f"""
-    When answering this logistics question: {prompt}
-    Consider this detailed data context:
-    {data_context}
-    Provide specific numbers and insights from the data where relevant.
+    Let the LLM plan a structured query for the question and run it locally
+    Args:
+        prompt: User question
+        df: Full dataset the query runs against
+        fingerprint: Precomputed dataframe_fingerprint(df)
+        use_cache: Set False to bypass the response cache for the planning call
+        history: Earlier messages, so follow-ups like "and for DHL?" can be planned
+        conversation_id: Conversation the history belongs to
+    Returns:
+        dict: {"query", "result", "schema", "fingerprint"}, or None when no query applies
     """
-    
-    return ask_gpt(enhanced_prompt, full_system)
+    try:
+        fingerprint = fingerprint or frame_fingerprint(df)
+    except Exception as e:
+        raise ChatbotError(f"Data summarization error: {str(e)}")
+    schema = get_data_schema(df, fingerprint)
+    plan = ask_gpt(build_planner_prompt(prompt, schema), QUERY_PLANNER_SYSTEM,
+                   dataset_fingerprint=fingerprint, use_cache=use_cache,
+                   history=history, conversation_id=conversation_id)
+    with tracing.span("query", rows=len(df)) as span:
+        try:
+            spec = parse_query(plan)
+            if spec is None:
+                span.set(planned=False)
+                return None
+            result = execute_query(df, spec)
+        except QueryError as e:
+            # An unusable plan falls back to the summary-based answer
+            span.set(planned=False, query_error=str(e))
+            return None
+        span.set(planned=True, result_rows=len(result))
+    return {"query": spec, "result": result, "schema": schema, "fingerprint": fingerprint}
+
+def _build_query_prompts(prompt: str, df: pd.DataFrame, system_content: Optional[str],
+                         query_info: Dict) -> Tuple[str, str]:
+    """Return (user prompt, system message) grounded in an executed query result"""
+    with tracing.span("prompt", mode="query") as span:
+        if not system_content:
+            system_content = DEFAULT_DATA_SYSTEM_CONTENT
+        full_system = f"""
+        {system_content}
+        The figures you receive were computed exactly over the full dataset.
+        Quote numbers only from the query result; never estimate or invent them.
+        """
+        result_block = format_result(query_info["result"], query_info["query"], len(df))
+        evidence = _evidence_block(prompt, df, query_info["fingerprint"])
+        enhanced_prompt = f"""
+        When answering this logistics question: {prompt}
+        Dataset schema:
+        {query_info["schema"]}
+        {result_block}
+        {evidence}
+        Answer with these exact figures and add practical insights where relevant.
+        """
+        span.set(data_context_chars=len(query_info["schema"]) + len(result_block), evidence_chars=len(evidence),
+                 prompt_chars=len(enhanced_prompt) + len(full_system))
+        return enhanced_prompt, full_system
+
+def ask_gpt_with_query_stream(prompt: str, df: pd.DataFrame, system_content: str = None,
+                              use_cache: bool = True, history: Optional[List[Dict]] = None,
+                              conversation_id: Optional[str] = None) -> Tuple[Iterator[str], Optional[Dict]]:
+    """
+    Answer a data question from a locally computed query result, streaming the reply
+    Falls back to the summary-based ask_gpt_with_data_stream when the
+    question cannot be expressed as a query.
+    Returns:
+        tuple: (chunk iterator, query info from run_data_query or None)
+    """
+    try:
+        fingerprint = frame_fingerprint(df)
+    except Exception as e:
+        raise ChatbotError(f"Data summarization error: {str(e)}")
+    query_info = run_data_query(prompt, df, fingerprint=fingerprint, use_cache=use_cache,
+                                history=history, conversation_id=conversation_id)
+    if query_info is None:
+        return ask_gpt_with_data_stream(prompt, df, system_content, use_cache=use_cache,
+                                        history=history, conversation_id=conversation_id), None
+    enhanced_prompt, full_system = _build_query_prompts(prompt, df, system_content, query_info)
+    stream = ask_gpt_stream(enhanced_prompt, full_system, dataset_fingerprint=fingerprint, use_cache=use_cache,
+                            history=history, conversation_id=conversation_id)
+    return stream, query_info
+
+def ask_gpt_with_query(prompt: str, df: pd.DataFrame, system_content: str = None,
+                       use_cache: bool = True, history: Optional[List[Dict]] = None,
+                       conversation_id: Optional[str] = None) -> str:
+    """Non-streaming counterpart of ask_gpt_with_query_stream"""
+    stream, _ = ask_gpt_with_query_stream(prompt, df, system_content, use_cache=use_cache,
+                                          history=history, conversation_id=conversation_id)
+    return "".join(stream)
 
 def save_chat_history(history: List[Dict], filename: str = "chat_history.json") -> None:
-    """Save chat history to JSON file"""
+    """Save chat history to JSON file (legacy format; written atomically)"""
     try:
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+        with tracing.span("history.save", messages=len(history)):
+            tmp_filename = filename + ".tmp"
+            with open(tmp_filename, "w", encoding="utf-8") as f:
+                json.dump(history, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_filename, filename)
     except IOError as e:
         raise ChatbotError(f"Failed to save chat history: {str(e)}")
 
@@ -172,4 +534,83 @@ def get_conversation_metadata(filename: str = "conversations.json") -> List[Dict
                 return json.load(f)
         return []
     except Exception as e:
-        raise ChatbotError(f"Failed to load conversations: {str(e)}")
\ No newline at end of file
+        raise ChatbotError(f"Failed to load conversations: {str(e)}")
+
+_conversation_store: Optional[ConversationStore] = None
+
+def get_conversation_store() -> ConversationStore:
+    """Return the process-wide conversation store"""
+    global _conversation_store
+    if _conversation_store is None:
+        try:
+            _conversation_store = ConversationStore()
+        except Exception as e:
+            raise ChatbotError(f"Failed to open conversation store: {str(e)}")
+    return _conversation_store
+
+def append_chat_messages(conversation_id: str, messages: List[Dict]) -> None:
+    """Append new messages to a conversation without rewriting earlier ones"""
+    try:
+        with tracing.span("history.append", messages=len(messages),
+                          chars=sum(len(m.get("content") or "") for m in messages)):
+            get_conversation_store().append_messages(conversation_id, messages)
+    except StorageError as e:
+        raise ChatbotError(str(e))
+
+def load_chat_history(conversation_id: str, limit: Optional[int] = None,
+                      before_id: Optional[int] = None) -> List[Dict]:
+    """
+    Load the most recent messages of a conversation
+    Args:
+        conversation_id: Conversation to read
+        limit: Maximum number of messages, newest first when paging
+        before_id: Only messages older than this message id
+    Returns:
+        list: Messages in chronological order
+    """
+    try:
+        return get_conversation_store().load_messages(conversation_id, limit=limit, before_id=before_id)
+    except StorageError as e:
+        raise ChatbotError(str(e))
+
+def clear_conversation_history(conversation_id: str) -> None:
+    """Delete all stored messages of a conversation"""
+    try:
+        get_conversation_store().clear_conversation(conversation_id)
+    except StorageError as e:
+        raise ChatbotError(str(e))
+
+def save_conversation(conversation: Dict) -> None:
+    """Create a conversation or update its title (keys: id, title, created_at)"""
+    try:
+        get_conversation_store().upsert_conversation(conversation)
+    except StorageError as e:
+        raise ChatbotError(str(e))
+
+def get_conversation(conversation_id: str) -> Optional[Dict]:
+    """Look a conversation up by id"""
+    try:
+        return get_conversation_store().get_conversation(conversation_id)
+    except StorageError as e:
+        raise ChatbotError(str(e))
+
+def list_conversations(limit: int = 20, offset: int = 0) -> List[Dict]:
+    """One page of saved conversations, newest first"""
+    try:
+        return get_conversation_store().list_conversations(limit=limit, offset=offset)
+    except StorageError as e:
+        raise ChatbotError(str(e))
+
+def count_conversations() -> int:
+    """Total number of saved conversations"""
+    try:
+        return get_conversation_store().count_conversations()
+    except StorageError as e:
+        raise ChatbotError(str(e))
+
+def search_conversations(query: str, limit: int = 20) -> List[Dict]:
+    """Full-text search over the content of every saved message"""
+    try:
+        return get_conversation_store().search_messages(query, limit=limit)
+    except StorageError as e:
+        raise ChatbotError(str(e))